@@ -0,0 +1 @@
+"""Herramientas de mantenimiento en Python para CATAI (no se sirven por HTTP)."""
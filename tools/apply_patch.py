@@ -0,0 +1,349 @@
+"""Applier for the ``*** Begin Patch`` format (see ``_tmp_patch.diff``).
+
+Supported operations::
+
+    *** Begin Patch
+    *** Update File: api/ai_extract_file_vs_correct.php
+    *** Move to: api/new_name.php          (optional)
+    @@ optional anchor line
+     context
+    -removed
+    +added
+    *** End of File                        (optional, hunk must end the file)
+    *** Add File: api/new.php
+    +line
+    *** Delete File: api/old.php
+    *** End Patch
+
+Each target file gets a line index (normalized line -> line numbers), so a
+hunk is located by looking up its rarest line and verifying the candidates
+instead of rescanning the file. Matching is tried exactly first and then with
+growing tolerance to whitespace drift (trailing spaces, indentation and
+internal runs of blanks); CRLF/LF differences are always ignored. Added lines
+take the target file's line ending and its BOM is kept.
+
+A batch of patches is resolved fully in memory first; nothing is written if
+any hunk fails, and ``--dry-run`` only prints the report.
+
+Usage::
+
+    python -m tools.apply_patch _tmp_patch.diff [more.diff ...] [--root .] [--dry-run]
+"""
+
+import argparse
+import re
+import sys
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from tools.patch_engine import BOM, PatchError, detect_newline, write_atomic
+
+LEVELS = ('exact', 'rstrip', 'strip', 'collapse')
+_BLANKS = re.compile(r'\s+')
+
+
+def normalize(line, level):
+    line = line.rstrip('\r\n')
+    if level == 'exact':
+        return line
+    if level == 'rstrip':
+        return line.rstrip()
+    if level == 'strip':
+        return line.strip()
+    return _BLANKS.sub(' ', line.strip())
+
+
+@dataclass
+class Hunk:
+    anchor: str | None = None
+    lines: list = field(default_factory=list)  # (' '|'-'|'+', text)
+    end_of_file: bool = False
+
+    @property
+    def old(self):
+        return [text for tag, text in self.lines if tag != '+']
+
+    @property
+    def new(self):
+        return [text for tag, text in self.lines if tag != '-']
+
+
+@dataclass
+class FileOp:
+    kind: str  # 'update' | 'add' | 'delete'
+    path: str
+    move_to: str | None = None
+    hunks: list = field(default_factory=list)
+
+
+def parse_patch(text):
+    """Parse one ``*** Begin Patch`` document into a list of ``FileOp``."""
+    lines = text.lstrip('\ufeff').splitlines()
+    while lines and not lines[-1].strip():
+        lines.pop()
+    if not lines or lines[0].strip() != '*** Begin Patch':
+        raise PatchError("patch must start with '*** Begin Patch'")
+    if lines[-1].strip() != '*** End Patch':
+        raise PatchError("patch must end with '*** End Patch'")
+
+    ops, op, hunk = [], None, None
+    for number, line in enumerate(lines[1:-1], start=2):
+        if line.startswith('*** Update File: '):
+            op, hunk = FileOp('update', line[17:].strip()), None
+            ops.append(op)
+        elif line.startswith('*** Add File: '):
+            op, hunk = FileOp('add', line[14:].strip()), Hunk()
+            op.hunks.append(hunk)
+            ops.append(op)
+        elif line.startswith('*** Delete File: '):
+            op, hunk = FileOp('delete', line[17:].strip()), None
+            ops.append(op)
+        elif op is None:
+            raise PatchError(f'line {number}: content before any file header')
+        elif line.startswith('*** Move to: ') and op.kind == 'update':
+            op.move_to = line[13:].strip()
+        elif line.strip() == '*** End of File' and hunk is not None:
+            hunk.end_of_file = True
+        elif line.startswith('@@') and op.kind == 'update':
+            hunk = Hunk(anchor=line[2:].strip() or None)
+            op.hunks.append(hunk)
+        elif op.kind == 'delete':
+            raise PatchError(f'line {number}: unexpected content after Delete File')
+        elif op.kind == 'add':
+            if not line.startswith('+'):
+                raise PatchError(f"line {number}: Add File lines must start with '+'")
+            hunk.lines.append(('+', line[1:]))
+        else:
+            if hunk is None:
+                # Update sin '@@': el primer bloque empieza directamente.
+                hunk = Hunk()
+                op.hunks.append(hunk)
+            if line == '':
+                hunk.lines.append((' ', ''))
+            elif line[0] in ' -+':
+                hunk.lines.append((line[0], line[1:]))
+            else:
+                raise PatchError(f'line {number}: invalid hunk line {line!r}')
+    return ops
+
+
+class LineIndex:
+    """Normalized line -> ascending line numbers, built lazily per level."""
+
+    def __init__(self, lines):
+        self.lines = lines
+        self._maps = {}
+        self._keys = {}
+
+    def keys(self, level):
+        if level not in self._keys:
+            self._keys[level] = [normalize(line, level) for line in self.lines]
+        return self._keys[level]
+
+    def positions(self, key, level):
+        if level not in self._maps:
+            table = {}
+            for number, k in enumerate(self.keys(level)):
+                table.setdefault(k, []).append(number)
+            self._maps[level] = table
+        return self._maps[level].get(key, ())
+
+    def find(self, block, start, level, end_of_file=False):
+        """First line number >= ``start`` where ``block`` matches, else None."""
+        wanted = [normalize(line, level) for line in block]
+        keys = self.keys(level)
+        # El ancla es la línea del bloque con menos apariciones en el archivo.
+        pivot = min(range(len(wanted)), key=lambda i: len(self.positions(wanted[i], level)))
+        for pos in self.positions(wanted[pivot], level):
+            first = pos - pivot
+            if first < start or first + len(wanted) > len(keys):
+                continue
+            if end_of_file and first + len(wanted) != len(keys):
+                continue
+            if keys[first:first + len(wanted)] == wanted:
+                return first
+        return None
+
+
+@dataclass
+class HunkReport:
+    line: int
+    level: str
+    removed: int
+    added: int
+
+
+@dataclass
+class FileReport:
+    path: str
+    kind: str
+    move_to: str | None = None
+    hunks: list = field(default_factory=list)
+    error: str | None = None
+    content: bytes | None = None
+
+
+def _split(text):
+    # Solo '\n' corta líneas; splitlines() también corta en \x0c, \u2028, etc.
+    parts = text.split('\n')
+    lines = [part + '\n' for part in parts[:-1]]
+    if parts[-1]:
+        lines.append(parts[-1])
+    return lines
+
+
+def locate(index, hunk, cursor):
+    """Return ``(first_line, level)`` for ``hunk`` at or after ``cursor``."""
+    old = hunk.old
+    for level in LEVELS:
+        start = cursor
+        if hunk.anchor:
+            anchor = index.find([hunk.anchor], cursor, level)
+            if anchor is None:
+                continue
+            start = anchor + 1
+        if not old:
+            return (len(index.lines) if hunk.end_of_file or not hunk.anchor else start), level
+        first = index.find(old, start, level, hunk.end_of_file)
+        if first is not None:
+            return first, level
+    raise PatchError(f'hunk not found (anchor={hunk.anchor!r}, first line={old[0] if old else None!r})')
+
+
+def apply_update(raw, hunks):
+    """Apply ``hunks`` to file bytes; returns ``(new_bytes, [HunkReport])``."""
+    bom = raw.startswith(BOM)
+    text = raw[len(BOM) if bom else 0:].decode('utf-8', 'surrogateescape')
+    newline = detect_newline(text)
+    lines = _split(text)
+    index = LineIndex(lines)
+
+    replacements, reports, cursor = [], [], 0
+    for hunk in hunks:
+        first, level = locate(index, hunk, cursor)
+        count = len(hunk.old)
+        replacements.append((first, first + count, hunk))
+        removed = sum(1 for tag, _ in hunk.lines if tag == '-')
+        reports.append(HunkReport(first + 1, level, removed, len(hunk.new) - count + removed))
+        cursor = first + count
+
+    out, last = [], 0
+    for first, stop, hunk in replacements:
+        out.extend(lines[last:first])
+        pos = first
+        for tag, line in hunk.lines:
+            if tag == '+':
+                if out and not out[-1].endswith('\n'):
+                    out[-1] += newline  # la última línea no tenía salto: se añade antes de seguir
+                out.append(line + newline)
+            else:
+                if tag == ' ':
+                    out.append(lines[pos])  # el contexto conserva el texto original del archivo
+                pos += 1
+        last = stop
+    out.extend(lines[last:])
+    if lines and not lines[-1].endswith('\n') and out and out[-1].endswith('\n'):
+        # El archivo no terminaba en salto de línea: se mantiene así.
+        out[-1] = out[-1][:-len(newline)] if out[-1].endswith(newline) else out[-1].rstrip('\r\n')
+    data = ''.join(out).encode('utf-8', 'surrogateescape')
+    return (BOM + data if bom else data), reports
+
+
+def _exists(path, pending):
+    key = str(path)
+    return pending[key] is not None if key in pending else path.exists()
+
+
+def plan(ops, root, pending=None):
+    """Resolve ``ops`` against disk (or ``pending`` in-memory results)."""
+    root = Path(root)
+    pending = {} if pending is None else pending
+    reports = []
+    for op in ops:
+        report = FileReport(op.path, op.kind, op.move_to)
+        reports.append(report)
+        target = root / op.path
+        key = str(target)
+        try:
+            if key in pending:
+                current = pending[key]
+            else:
+                current = target.read_bytes() if target.exists() else None
+            if op.kind == 'add':
+                if current is not None:
+                    raise PatchError('file already exists')
+                body = ''.join(text + '\n' for text in op.hunks[0].new)
+                report.content = body.encode('utf-8')
+                report.hunks.append(HunkReport(1, 'exact', 0, len(op.hunks[0].new)))
+            elif current is None:
+                raise PatchError('file not found')
+            elif op.kind == 'delete':
+                report.content = None
+            else:
+                if op.move_to and _exists(root / op.move_to, pending) and root / op.move_to != target:
+                    raise PatchError(f'move target already exists: {op.move_to}')
+                report.content, report.hunks = apply_update(current, op.hunks)
+        except PatchError as exc:
+            report.error = str(exc)
+            continue
+        pending[key] = report.content
+        if op.move_to:
+            pending[key] = None
+            pending[str(root / op.move_to)] = report.content
+    return reports, pending
+
+
+def apply_patches(patch_texts, root='.', dry_run=False):
+    """Apply several patches as one batch. Returns the list of ``FileReport``."""
+    reports, pending = [], {}
+    for text in patch_texts:
+        try:
+            ops = parse_patch(text)
+        except PatchError as exc:
+            reports.append(FileReport('<patch>', 'parse', error=str(exc)))
+            continue
+        batch, pending = plan(ops, root, pending)
+        reports.extend(batch)
+    if dry_run or any(r.error for r in reports):
+        return reports
+    for key, content in pending.items():
+        path = Path(key)
+        if content is None:
+            if path.exists():
+                path.unlink()
+        else:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            write_atomic(path, content)
+    return reports
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Apply '*** Begin Patch' files.")
+    parser.add_argument('patches', nargs='+', help="patch files ('-' for stdin)")
+    parser.add_argument('--root', default='.', help='base directory for file paths')
+    parser.add_argument('--dry-run', action='store_true', help='report without writing')
+    args = parser.parse_args(argv)
+
+    texts = [
+        sys.stdin.read() if name == '-' else Path(name).read_text(encoding='utf-8-sig')
+        for name in args.patches
+    ]
+    reports = apply_patches(texts, args.root, args.dry_run)
+    failed = any(r.error for r in reports)
+    for r in reports:
+        target = f'{r.path} -> {r.move_to}' if r.move_to else r.path
+        if r.error:
+            print(f'error   {r.kind:6} {target}: {r.error}')
+            continue
+        print(f'ok      {r.kind:6} {target}')
+        for h in r.hunks:
+            print(f'          @{h.line} [{h.level}] -{h.removed} +{h.added}')
+    if failed:
+        print('nothing written: fix the failing hunks and retry')
+    elif args.dry_run:
+        print('dry run: nothing written')
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,661 @@
+"""Local OHLCV bar cache with gap-only fetching for the ``time_series.php`` providers.
+
+``time_series.php`` downloads the full history from Tiingo / Alpha Vantage on
+every request. This cache keeps bars per ``(symbol, norm_reso(resolution))``
+and only asks the provider for the time ranges it has not seen yet:
+
+    cache/SPY/5min.t      int64 epoch seconds  (column, append-only)
+    cache/SPY/5min.c      float64 close        (column, append-only)
+    cache/SPY/5min.json   coverage intervals, bar count, last access
+    cache/SPY/5min.lock   flock() target shared with other processes
+
+Columns are fixed-width and read through ``mmap`` + binary search, so a range
+read touches only the matching records. Coverage is tracked per interval
+(not per bar), so nights and weekends without bars are not fetched again.
+Only the interval the fetcher reports as answered is recorded: a provider
+that lags or returns a truncated series leaves the rest as a gap, and the
+head of the series stays open until a full bar has closed.
+
+Concurrent requests for the same key share one upstream call: threads of
+one process wait on the in-flight fetch (single-flight) and other processes
+serialize on the key's ``flock`` and then re-check what is still missing.
+Reads and writes of a key also take an in-process shared/exclusive lock, so
+``read()`` never maps columns that ``_store`` is truncating or replacing,
+even on Windows where ``flock`` is unavailable.
+``evict()`` removes keys by age and then least-recently-used until the cache
+fits the size budget.
+
+Usage::
+
+    python -m tools.bar_cache stub --port 8765                  # stand-in Tiingo API
+    python -m tools.bar_cache get SPY 5min --since 2d --base-url http://127.0.0.1:8765 --token x
+    python -m tools.bar_cache serve --port 8766 --token $TIINGO_API_KEY
+    python -m tools.bar_cache evict --max-mb 512 --max-age 7d
+"""
+
+import argparse
+import bisect
+import calendar
+import json
+import math
+import mmap
+import os
+import re
+import sys
+import threading
+import time
+import urllib.parse
+import urllib.request
+from array import array
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows: solo single-flight dentro del proceso
+    fcntl = None
+
+RESO_SECONDS = {
+    '1min': 60, '5min': 300, '15min': 900, '30min': 1800, '60min': 3600,
+    'daily': 86400, 'weekly': 7 * 86400,
+}
+# Mismo mapeo que fetch_tiingo() (30min se pide como 15min).
+TIINGO_INTERVAL = {
+    '1min': '1min', '5min': '5min', '15min': '15min', '30min': '15min',
+    '60min': '60min', 'daily': 'daily', 'weekly': 'weekly',
+}
+_AGE_RE = re.compile(r'^(\d+(?:\.\d+)?)([smhd])$')
+
+
+def norm_reso(value):
+    """Port of ``norm_reso()`` in ``time_series.php``."""
+    x = str(value).strip().lower()
+    for old, new in ((' ', ''), ('min.', 'min'), ('mins', 'min')):
+        x = x.replace(old, new)
+    aliases = {
+        '60min': ('1h', '1hr', '1hour', '60', '60m', '60min'),
+        '30min': ('30', '30m', '30min'),
+        '15min': ('15', '15m', '15min'),
+        '5min': ('5', '5m', '5min'),
+        '1min': ('1', '1m', '1min'),
+        'daily': ('d', '1d', 'day', 'daily'),
+        'weekly': ('w', '1w', 'week', 'weekly'),
+    }
+    for reso, names in aliases.items():
+        if x in names:
+            return reso
+    return x
+
+
+def parse_age(value):
+    match = _AGE_RE.match(str(value).strip())
+    if not match:
+        return float(value)
+    return float(match.group(1)) * {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}[match.group(2)]
+
+
+def _merge_intervals(intervals):
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+
+def _subtract(start, end, covered):
+    """Parts of ``[start, end]`` not inside any ``covered`` interval."""
+    gaps, cursor = [], start
+    for c_start, c_end in covered:
+        if c_end < cursor:
+            continue
+        if c_start > end:
+            break
+        if c_start > cursor:
+            gaps.append((cursor, min(c_start, end)))
+        cursor = max(cursor, c_end)
+        if cursor >= end:
+            break
+    if cursor < end:
+        gaps.append((cursor, end))
+    return gaps
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.error = None
+
+
+class _RWLock:
+    """Shared/exclusive lock between the threads of one process.
+
+    ``flock`` already covers other processes (and, per open file, threads on
+    POSIX), but Windows has no ``fcntl``; this keeps ``read()`` from mapping
+    the columns while ``_store`` truncates or replaces them on every platform.
+    Waiting writers block new readers so a steady read load cannot starve them.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._readers = 0
+        self._writer = False
+        self._waiting = 0
+
+    @contextmanager
+    def shared(self):
+        with self._cond:
+            self._cond.wait_for(lambda: not self._writer and not self._waiting)
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                self._cond.notify_all()
+
+    @contextmanager
+    def exclusive(self):
+        with self._cond:
+            self._waiting += 1
+            self._cond.wait_for(lambda: not self._writer and not self._readers)
+            self._waiting -= 1
+            self._writer = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writer = False
+                self._cond.notify_all()
+
+
+class BarCache:
+    """Bar store keyed by ``(symbol, resolution)``.
+
+    ``fetcher(symbol, reso, start, end)`` returns ``(bars, covered)``:
+    ``[(t, close), ...]`` for the requested epoch range and the ``(start, end)``
+    interval the provider actually answered (``None`` if nothing); see
+    ``TiingoFetcher`` / ``AlphaVantageFetcher``.
+    """
+
+    def __init__(self, root, fetcher, clock=time.time):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.fetcher = fetcher
+        self.clock = clock
+        self.upstream_calls = 0
+        self._guard = threading.Lock()
+        self._inflight = {}
+        self._rwlocks = {}
+
+    # ------------------------------------------------------------ layout
+
+    @staticmethod
+    def key(symbol, reso):
+        return symbol.strip().upper(), norm_reso(reso)
+
+    def _paths(self, key):
+        symbol, reso = key
+        base = self.root / re.sub(r'[^A-Z0-9._-]', '_', symbol) / reso
+        return {ext: base.with_suffix('.' + ext) for ext in ('t', 'c', 'json', 'lock')}
+
+    def _meta(self, key):
+        path = self._paths(key)['json']
+        if path.exists():
+            return json.loads(path.read_text(encoding='utf-8'))
+        return {'coverage': [], 'count': 0, 'last_access': 0}
+
+    def _save_meta(self, key, meta):
+        path = self._paths(key)['json']
+        tmp = path.with_name(path.name + '.tmp')
+        tmp.write_text(json.dumps(meta), encoding='utf-8')
+        os.replace(tmp, path)
+
+    @contextmanager
+    def _flock(self, key, exclusive):
+        """Hold the key's in-process ``_RWLock`` and, where available, its ``flock``."""
+        with self._guard:
+            rwlock = self._rwlocks.setdefault(key, _RWLock())
+        paths = self._paths(key)
+        paths['lock'].parent.mkdir(parents=True, exist_ok=True)
+        with (rwlock.exclusive() if exclusive else rwlock.shared()), open(paths['lock'], 'a+') as handle:
+            if fcntl is not None:
+                fcntl.flock(handle, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            yield handle
+
+    # -------------------------------------------------------------- read
+
+    def read(self, key, start=None, end=None):
+        """Bars of ``key`` with ``start <= t <= end`` as ``[{'t', 'c'}]`` (time_series.php rows)."""
+        paths = self._paths(key)
+        if not paths['json'].exists():
+            return []
+        with self._flock(key, exclusive=False):
+            count = self._meta(key)['count']
+            if not count:
+                return []
+            with open(paths['t'], 'rb') as ft, open(paths['c'], 'rb') as fc, \
+                    mmap.mmap(ft.fileno(), count * 8, access=mmap.ACCESS_READ) as mt, \
+                    mmap.mmap(fc.fileno(), count * 8, access=mmap.ACCESS_READ) as mc:
+                times = memoryview(mt).cast('q')
+                closes = memoryview(mc).cast('d')
+                lo = 0 if start is None else bisect.bisect_left(times, start)
+                hi = count if end is None else bisect.bisect_right(times, end)
+                rows = [{'t': t, 'c': c} for t, c in zip(times[lo:hi].tolist(), closes[lo:hi].tolist())]
+                times.release()
+                closes.release()
+        return rows
+
+    # ------------------------------------------------------------- write
+
+    def _store(self, key, bars, covered):
+        """Merge ``bars`` and ``covered`` intervals into the key (caller holds the lock)."""
+        paths = self._paths(key)
+        meta = self._meta(key)
+        count = meta['count']
+        bars = sorted({int(t): float(c) for t, c in bars}.items())
+        last = None
+        if count:
+            with open(paths['t'], 'rb') as ft:
+                ft.seek((count - 1) * 8)
+                last = array('q', ft.read(8))[0]
+        if bars and (last is None or bars[0][0] > last):
+            # Caso normal: solo barras nuevas al final -> append.
+            for ext, column in (('t', array('q', (t for t, _ in bars))), ('c', array('d', (c for _, c in bars)))):
+                with open(paths[ext], 'ab') as handle:
+                    handle.truncate(count * 8)
+                    column.tofile(handle)
+            count += len(bars)
+        elif bars:
+            existing = dict((row['t'], row['c']) for row in self._read_all(paths, count))
+            existing.update(bars)
+            merged = sorted(existing.items())
+            for ext, column in (('t', array('q', (t for t, _ in merged))), ('c', array('d', (c for _, c in merged)))):
+                tmp = paths[ext].with_name(paths[ext].name + '.tmp')
+                with open(tmp, 'wb') as handle:
+                    column.tofile(handle)
+                os.replace(tmp, paths[ext])
+            count = len(merged)
+        meta['count'] = count
+        meta['coverage'] = _merge_intervals(meta['coverage'] + [list(c) for c in covered])
+        meta['last_access'] = self.clock()
+        self._save_meta(key, meta)
+
+    @staticmethod
+    def _read_all(paths, count):
+        times, closes = array('q'), array('d')
+        with open(paths['t'], 'rb') as ft, open(paths['c'], 'rb') as fc:
+            times.fromfile(ft, count)
+            closes.fromfile(fc, count)
+        return [{'t': t, 'c': c} for t, c in zip(times, closes)]
+
+    # ----------------------------------------------------------- fetching
+
+    def missing(self, key, start, end, now=None):
+        """Intervals of ``[start, end]`` the cache cannot answer yet."""
+        now = self.clock() if now is None else now
+        open_bar = self._open_bar(key, now)
+        gaps = _subtract(start, end, self._meta(key)['coverage'])
+        # Un hueco dentro de la vela aún abierta no tiene barras nuevas que pedir.
+        return [(s, e) for s, e in gaps if s < open_bar]
+
+    @staticmethod
+    def _open_bar(key, now):
+        step = RESO_SECONDS.get(key[1], 60)
+        return now - now % step
+
+    def _fill(self, key, start, end):
+        with self._flock(key, exclusive=True):
+            now = self.clock()
+            gaps = self.missing(key, start, end, now)  # otro proceso pudo llenarlo
+            if not gaps:
+                return
+            open_bar = self._open_bar(key, now)
+            bars, covered = [], []
+            for g_start, g_end in gaps:
+                self.upstream_calls += 1
+                fetched, answered = self.fetcher(key[0], key[1], g_start, g_end)
+                bars.extend(fetched)
+                if answered is None:
+                    continue
+                # La vela todavía abierta no cuenta como cubierta: se vuelve a pedir.
+                covered.append((max(g_start, answered[0]), min(g_end, answered[1], open_bar)))
+            self._store(key, bars, [c for c in covered if c[1] > c[0]])
+
+    def _single_flight(self, key, fn):
+        with self._guard:
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = _Flight()
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return
+        try:
+            fn()
+        except Exception as exc:
+            flight.error = exc
+            raise
+        finally:
+            with self._guard:
+                del self._inflight[key]
+            flight.done.set()
+
+    def get(self, symbol, reso, start, end=None):
+        """Bars for ``[start, end]`` (``end`` defaults to now), fetching only the gaps."""
+        key = self.key(symbol, reso)
+        end = self.clock() if end is None else end
+        for _ in range(3):
+            if not self.missing(key, start, end):
+                break
+            self._single_flight(key, lambda: self._fill(key, start, end))
+        rows = self.read(key, start, end)
+        self._touch(key)
+        return rows
+
+    def _touch(self, key, every=60):
+        paths = self._paths(key)
+        if paths['json'].exists() and self.clock() - self._meta(key)['last_access'] > every:
+            with self._flock(key, exclusive=True):
+                meta = self._meta(key)
+                meta['last_access'] = self.clock()
+                self._save_meta(key, meta)
+
+    # ----------------------------------------------------------- eviction
+
+    def entries(self):
+        for meta_path in self.root.glob('*/*.json'):
+            key = (meta_path.parent.name, meta_path.stem)
+            paths = self._paths(key)
+            size = sum(paths[ext].stat().st_size for ext in ('t', 'c', 'json') if paths[ext].exists())
+            yield key, self._meta(key), size
+
+    def evict(self, max_bytes=None, max_age=None):
+        """Drop keys idle for more than ``max_age`` seconds, then LRU until under ``max_bytes``."""
+        now = self.clock()
+        entries = sorted(self.entries(), key=lambda e: e[1].get('last_access', 0))
+        total = sum(size for _, _, size in entries)
+        removed = []
+        for key, meta, size in entries:
+            too_old = max_age is not None and now - meta.get('last_access', 0) > max_age
+            too_big = max_bytes is not None and total > max_bytes
+            if not (too_old or too_big):
+                continue
+            with self._flock(key, exclusive=True):
+                for ext in ('t', 'c', 'json'):
+                    self._paths(key)[ext].unlink(missing_ok=True)
+            total -= size
+            removed.append(key)
+        return removed
+
+
+# ------------------------------------------------------------------ fetchers
+
+def _http_get_json(url, timeout, retries):
+    """Like ``http_get_json_retry()``: JSON only, 2xx only, exponential backoff."""
+    for attempt in range(1, max(1, retries + 1) + 1):
+        try:
+            request = urllib.request.Request(url, headers={'Accept': 'application/json'})
+            with urllib.request.urlopen(request, timeout=timeout) as response:
+                body = response.read().decode('utf-8').strip()
+            if body.startswith('<'):
+                raise ValueError(f'non_json_html prefix={body[:120]}')
+            return json.loads(body) if body else []
+        except Exception:
+            if attempt > retries:
+                raise
+            time.sleep(min(0.1 * 2 ** (attempt - 1), 0.8))
+    return []
+
+
+def _iso_to_epoch(value):
+    return int(datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp())
+
+
+def _local_epoch(stamp, fmt):
+    """Naive provider timestamp -> epoch in the local timezone, like PHP's ``strtotime()``.
+
+    ``time_series.php`` does not set a timezone, so it uses ``date.timezone``;
+    run this process with the same ``TZ`` to get the same ``t`` values.
+    """
+    return int(time.mktime(time.strptime(stamp, fmt)))
+
+
+def _day(epoch):
+    return datetime.fromtimestamp(epoch, timezone.utc).strftime('%Y-%m-%d')
+
+
+def _answered(start, end, bars, step, settled):
+    """Part of ``[start, end]`` a response vouches for.
+
+    Up to ``settled`` (now minus the provider delay) an empty stretch means
+    "no bars there"; after it only the bars actually returned count, so a
+    lagging provider is asked again later.
+    """
+    newest = max((t for t, _ in bars), default=None)
+    upto = settled if newest is None else max(settled, newest + step)
+    upto = min(end, upto)
+    return (start, upto) if upto > start else None
+
+
+class TiingoFetcher:
+    """Range fetcher for the Tiingo endpoints used by ``fetch_tiingo()``."""
+
+    def __init__(self, token, base_url='https://api.tiingo.com', timeout=25, retries=0,
+                 settle=86400, clock=time.time):
+        self.token = token
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.retries = retries
+        self.settle = settle
+        self.clock = clock
+
+    def __call__(self, symbol, reso, start, end):
+        interval = TIINGO_INTERVAL.get(reso, '5min')
+        params = {'token': self.token, 'startDate': _day(start), 'endDate': _day(end)}
+        quoted = urllib.parse.quote(symbol)
+        if interval in ('daily', 'weekly'):
+            url = f'{self.base_url}/tiingo/daily/{quoted}/prices?' + urllib.parse.urlencode(params)
+        else:
+            params.update(resampleFreq=interval, columns='date,close')
+            url = f'{self.base_url}/iex/{quoted}/prices?' + urllib.parse.urlencode(params)
+        bars = []
+        for row in _http_get_json(url, self.timeout, self.retries):
+            if not row.get('date') or row.get('close') is None:
+                continue
+            if interval in ('daily', 'weekly'):
+                t = _local_epoch(row['date'][:10] + ' 16:00:00', '%Y-%m-%d %H:%M:%S')
+            else:
+                t = _iso_to_epoch(row['date'])
+            bars.append((t, float(row['close'])))
+        step = RESO_SECONDS.get(reso, 300)
+        return bars, _answered(start, end, bars, step, self.clock() - self.settle)
+
+
+class AlphaVantageFetcher:
+    """Alpha Vantage has no range parameter: fetch ``compact`` and keep the range.
+
+    ``compact`` holds only the latest ~100 bars; when that does not reach back
+    to ``start`` the series is fetched again with ``outputsize=full``.
+    """
+
+    COMPACT_BARS = 100
+
+    def __init__(self, apikey, base_url='https://www.alphavantage.co', timeout=25, retries=0,
+                 settle=86400, clock=time.time):
+        self.apikey = apikey
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.retries = retries
+        self.settle = settle
+        self.clock = clock
+
+    def __call__(self, symbol, reso, start, end):
+        if reso in ('1min', '5min', '15min', '30min', '60min'):
+            params = {'function': 'TIME_SERIES_INTRADAY', 'interval': reso}
+            series_key = f'Time Series ({reso})'
+        elif reso == 'daily':
+            params, series_key = {'function': 'TIME_SERIES_DAILY'}, 'Time Series (Daily)'
+        else:
+            return [], None
+        series = self._series(params, symbol, series_key, 'compact')
+        if len(series) >= self.COMPACT_BARS and min(t for t, _ in series) > start:
+            series = self._series(params, symbol, series_key, 'full')  # compact no llega a start
+        if not series:
+            return [], None
+        bars = [(t, c) for t, c in series if start <= t <= end]
+        # Lo anterior a la vela más antigua de la respuesta no existe en el proveedor.
+        return bars, _answered(start, end, series, RESO_SECONDS[reso], self.clock() - self.settle)
+
+    def _series(self, params, symbol, series_key, outputsize):
+        params = dict(params, symbol=symbol, outputsize=outputsize, apikey=self.apikey)
+        data = _http_get_json(f'{self.base_url}/query?' + urllib.parse.urlencode(params), self.timeout, self.retries)
+        series = []
+        for stamp, row in (data.get(series_key) or {}).items():
+            fmt = '%Y-%m-%d %H:%M:%S' if len(stamp) > 10 else '%Y-%m-%d'
+            if '4. close' in row:
+                series.append((_local_epoch(stamp, fmt), float(row['4. close'])))
+        return series
+
+
+# --------------------------------------------------------------- stand-in API
+
+class StubTiingoHandler(BaseHTTPRequestHandler):
+    """Deterministic stand-in for the Tiingo IEX/daily endpoints (local testing)."""
+
+    def do_GET(self):
+        url = urllib.parse.urlparse(self.path)
+        query = dict(urllib.parse.parse_qsl(url.query))
+        parts = url.path.strip('/').split('/')
+        self.server.hits.append(self.path)
+        if parts[0] == 'iex' and len(parts) == 3:
+            step = RESO_SECONDS.get(query.get('resampleFreq', '5min'), 300)
+        elif parts[:2] == ['tiingo', 'daily'] and len(parts) == 4:
+            step = 86400
+        else:
+            self.send_error(404)
+            return
+        # Tiingo lee startDate/endDate como días UTC (los mismos que produce _day()).
+        start = calendar.timegm(time.strptime(query.get('startDate', '1970-01-01'), '%Y-%m-%d'))
+        end = calendar.timegm(time.strptime(query.get('endDate', _day(time.time())), '%Y-%m-%d')) + 86399
+        end = min(end, int(time.time()))
+        rows = []
+        for t in range(start - start % step, end + 1, step):
+            if t >= start:
+                stamp = datetime.fromtimestamp(t, timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.000Z')
+                rows.append({'date': stamp, 'close': round(100 + 5 * math.sin(t / 7200), 4)})
+        body = json.dumps(rows).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def serve_stub(port=8765, host='127.0.0.1'):
+    """Start the stand-in API in a daemon thread; ``server.hits`` lists requested paths."""
+    server = ThreadingHTTPServer((host, port), StubTiingoHandler)
+    server.hits = []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def make_service(cache, port=8766, host='127.0.0.1'):
+    """HTTP front for PHP: ``GET /bars?symbol=SPY&reso=5min&start=..&end=..`` -> rows."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urllib.parse.urlparse(self.path)
+            query = dict(urllib.parse.parse_qsl(url.query))
+            if url.path != '/bars' or not query.get('symbol') or not query.get('reso'):
+                self.send_error(400, 'missing_params')
+                return
+            try:
+                now = cache.clock()
+                start = int(query.get('start') or now - parse_age(query.get('since', '5d')))
+                end = int(query['end']) if query.get('end') else None
+                payload = {'ok': True, 'rows': cache.get(query['symbol'], query['reso'], start, end)}
+            except Exception as exc:
+                payload = {'ok': False, 'error': str(exc)}
+            body = json.dumps(payload).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    return ThreadingHTTPServer((host, port), Handler)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Local bar cache for time_series providers.')
+    parser.add_argument('--root', default='data/bar_cache', help='cache directory')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p_stub = sub.add_parser('stub', help='run the stand-in Tiingo API')
+    p_stub.add_argument('--port', type=int, default=8765)
+
+    for name in ('get', 'serve'):
+        p = sub.add_parser(name)
+        p.add_argument('--token', default=os.environ.get('TIINGO_API_KEY', ''))
+        p.add_argument('--base-url', default='https://api.tiingo.com')
+        if name == 'get':
+            p.add_argument('symbol')
+            p.add_argument('reso')
+            p.add_argument('--since', default='5d', help='age like 2d / 6h')
+        else:
+            p.add_argument('--port', type=int, default=8766)
+
+    p_evict = sub.add_parser('evict', help='apply size/age eviction')
+    p_evict.add_argument('--max-mb', type=float)
+    p_evict.add_argument('--max-age', help='age like 7d')
+
+    args = parser.parse_args(argv)
+    if args.command == 'stub':
+        server = serve_stub(args.port)
+        print(f'stand-in Tiingo API on http://127.0.0.1:{args.port}')
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            server.shutdown()
+        return 0
+
+    if args.command == 'evict':
+        cache = BarCache(args.root, fetcher=None)
+        max_bytes = int(args.max_mb * 1024 * 1024) if args.max_mb is not None else None
+        max_age = parse_age(args.max_age) if args.max_age else None
+        for key in cache.evict(max_bytes, max_age):
+            print('evicted', *key)
+        return 0
+
+    cache = BarCache(args.root, TiingoFetcher(args.token, args.base_url))
+    if args.command == 'get':
+        started = time.perf_counter()
+        rows = cache.get(args.symbol, args.reso, time.time() - parse_age(args.since))
+        elapsed = (time.perf_counter() - started) * 1000
+        print(json.dumps({'rows': len(rows), 'upstream_calls': cache.upstream_calls, 'ms': round(elapsed, 2),
+                          'last': rows[-1] if rows else None}))
+        return 0
+
+    server = make_service(cache, args.port)
+    print(f'bar cache on http://127.0.0.1:{args.port}/bars')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.shutdown()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
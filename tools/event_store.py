@@ -0,0 +1,504 @@
+"""Compacted, deduplicated and indexed store for JSONL event logs.
+
+Source streams are the ``{"ts", "uid", "ev", "data"}`` lines written to
+``prefs.log`` / ``data/prefs.log`` / ``requests.jsonl`` by ``settings_get`` and
+``settings_set``. The same big ``ai_prompt_ext_conten_file`` /
+``indicators_json`` payload is logged again on every request, so events are
+stored like this::
+
+    store/
+      manifest.json        segments (ts range, uids, evs, size) + source offsets
+      blobs.dat            every distinct large payload, once
+      blobs.idx            fixed-width records: digest -> (offset, length)
+      seg-000001.jsonl     compacted events, append-only
+      seg-000001.idx.json  uid / ev -> byte offsets inside the segment
+
+Compaction is bottom-up: strings of ``BLOB_MIN`` bytes or more are replaced
+by ``{"$ref": digest}``, and then the remaining object is referenced as a
+whole if it is still large, so repeated rows collapse to one tiny line.
+Keys of the logged data that start with ``$`` get one more ``$`` on disk, so
+a payload shaped like ``{"$ref": ...}`` is never taken for a blob reference.
+
+A query first prunes segments with the manifest (time range, uid, ev), then
+uses the segment index to read only the matching lines through ``mmap``.
+``follow`` keeps yielding new matches as more events are ingested.
+
+Usage::
+
+    python -m tools.event_store ingest STORE prefs.log data/prefs.log
+    python -m tools.event_store query STORE --uid 4 --ev settings_get --since 1h
+    python -m tools.event_store query STORE --ev settings_get:row --follow
+    python -m tools.event_store stats STORE
+"""
+
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import re
+import struct
+import sys
+import time
+from datetime import datetime, timezone
+from functools import lru_cache
+from pathlib import Path
+
+from tools.log_profiler import rotated_chain
+
+BLOB_MIN = 256
+SEGMENT_EVENTS = 50000
+DIGEST_SIZE = 16
+_IDX_RECORD = struct.Struct(f'<{DIGEST_SIZE}sQI')
+_DURATION_RE = re.compile(r'^(\d+(?:\.\d+)?)([smhd])$')
+
+
+def _dumps(value):
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':'), sort_keys=True)
+
+
+def parse_time(value, now=None):
+    """Epoch seconds from an epoch number, ISO-8601 text or a ``90s``/``15m``/``1h``/``7d`` age."""
+    if value is None or isinstance(value, (int, float)):
+        return value
+    match = _DURATION_RE.match(value.strip())
+    if match:
+        seconds = float(match.group(1)) * {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}[match.group(2)]
+        return (time.time() if now is None else now) - seconds
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parsed = datetime.fromisoformat(value.strip().replace('Z', '+00:00'))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def _escape_key(key):
+    return '$' + key if key.startswith('$') else key
+
+
+def _unescape_key(key):
+    return key[1:] if key.startswith('$$') else key
+
+
+def _write_json(path, data):
+    tmp = path.with_name(path.name + '.tmp')
+    tmp.write_text(json.dumps(data, ensure_ascii=False, separators=(',', ':')), encoding='utf-8')
+    os.replace(tmp, path)
+
+
+class BlobStore:
+    """Append-only content-addressed payload file.
+
+    Readers pick up blobs added by a concurrent writer by re-reading the tail
+    of ``blobs.idx`` when a digest is unknown.
+    """
+
+    def __init__(self, root):
+        self.data_path = root / 'blobs.dat'
+        self.idx_path = root / 'blobs.idx'
+        self.index = {}
+        self.added = 0
+        self._idx_pos = 0
+        self._writer = None
+        self._map = None
+        self.get = lru_cache(maxsize=1024)(self._get)
+        self._refresh()
+
+    def _refresh(self):
+        if not self.idx_path.exists():
+            return
+        data_size = self.data_path.stat().st_size if self.data_path.exists() else 0
+        with open(self.idx_path, 'rb') as handle:
+            handle.seek(self._idx_pos)
+            raw = handle.read()
+        for pos in range(0, len(raw) - len(raw) % _IDX_RECORD.size, _IDX_RECORD.size):
+            digest, offset, length = _IDX_RECORD.unpack_from(raw, pos)
+            if offset + length > data_size:
+                break  # registro de un append interrumpido (o aún sin datos)
+            self.index[digest.hex()] = (offset, length)
+            self._idx_pos += _IDX_RECORD.size
+
+    def _open_writer(self):
+        if self._writer is None:
+            self._refresh()
+            with open(self.idx_path, 'ab') as handle:
+                handle.truncate(self._idx_pos)
+            self._writer = (open(self.data_path, 'ab'), open(self.idx_path, 'ab'))
+        return self._writer
+
+    def put(self, payload):
+        data = payload.encode('utf-8')
+        digest = hashlib.blake2b(data, digest_size=DIGEST_SIZE)
+        key = digest.hexdigest()
+        if key not in self.index:
+            data_file, idx_file = self._open_writer()
+            offset = data_file.seek(0, os.SEEK_END)
+            data_file.write(data)
+            idx_file.write(_IDX_RECORD.pack(digest.digest(), offset, len(data)))
+            self.index[key] = (offset, len(data))
+            self._idx_pos += _IDX_RECORD.size
+            self.added += len(data)
+        return key
+
+    def flush(self):
+        if self._writer is not None:
+            for handle in self._writer:
+                handle.flush()
+
+    def _get(self, key):
+        if key not in self.index:
+            self._refresh()
+        offset, length = self.index[key]
+        if self._map is None or offset + length > len(self._map):
+            self.flush()
+            with open(self.data_path, 'rb') as handle:
+                self._map = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+        return json.loads(self._map[offset:offset + length].decode('utf-8'))
+
+    def close(self):
+        if self._writer is not None:
+            for handle in self._writer:
+                handle.close()
+            self._writer = None
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+
+
+class EventStore:
+    def __init__(self, root, blob_min=BLOB_MIN, segment_events=SEGMENT_EVENTS):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.blob_min = blob_min
+        self.segment_events = segment_events
+        self.manifest_path = self.root / 'manifest.json'
+        if self.manifest_path.exists():
+            self.manifest = json.loads(self.manifest_path.read_text(encoding='utf-8'))
+        else:
+            self.manifest = {'segments': [], 'sources': {}, 'raw_bytes': 0}
+        self.blobs = BlobStore(self.root)
+        self._active = None
+        self._dirty = False
+
+    # ------------------------------------------------------------------ write
+
+    def _compact(self, value):
+        if isinstance(value, str):
+            if len(value) >= self.blob_min:
+                return {'$ref': self.blobs.put(_dumps(value))}
+            return value
+        if isinstance(value, dict):
+            value = {_escape_key(k): self._compact(v) for k, v in value.items()}
+        elif isinstance(value, list):
+            value = [self._compact(v) for v in value]
+        else:
+            return value
+        encoded = _dumps(value)
+        if len(encoded) >= self.blob_min:
+            return {'$ref': self.blobs.put(encoded)}
+        return value
+
+    def _open_active(self):
+        if self._active is not None:
+            return self._active
+        segments = self.manifest['segments']
+        if not segments or segments[-1]['count'] >= self.segment_events:
+            name = f'seg-{len(segments) + 1:06d}'
+            segments.append({'name': name, 'count': 0, 'size': 0, 'min_ts': None,
+                             'max_ts': None, 'uids': [], 'evs': []})
+        meta = segments[-1]
+        path = self.root / f"{meta['name']}.jsonl"
+        idx_path = self.root / f"{meta['name']}.idx.json"
+        index = json.loads(idx_path.read_text(encoding='utf-8')) if meta['count'] else {'uid': {}, 'ev': {}}
+        handle = open(path, 'ab')
+        handle.truncate(meta['size'])  # descarta líneas no confirmadas en el manifest
+        self._active = (meta, handle, index)
+        return self._active
+
+    def _seal_active(self):
+        if self._active is None:
+            return
+        meta, handle, index = self._active
+        handle.flush()
+        _write_json(self.root / f"{meta['name']}.idx.json", index)
+        handle.close()
+        self._active = None
+
+    def append(self, event):
+        """Compact and append one decoded event; returns False if it has no usable ``ts``."""
+        try:
+            ts = parse_time(event.get('ts'))
+        except (TypeError, ValueError):
+            return False
+        if ts is None:
+            return False
+        meta, handle, index = self._open_active()
+        self._dirty = True
+        uid = '' if event.get('uid') is None else str(event.get('uid'))
+        ev = str(event.get('ev', ''))
+        record = {_escape_key(k): self._compact(v) for k, v in event.items()}
+        record['_t'] = ts
+        line = (_dumps(record) + '\n').encode('utf-8')
+        offset = meta['size']
+        handle.write(line)
+        meta['size'] += len(line)
+        meta['count'] += 1
+        meta['min_ts'] = ts if meta['min_ts'] is None else min(meta['min_ts'], ts)
+        meta['max_ts'] = ts if meta['max_ts'] is None else max(meta['max_ts'], ts)
+        index['uid'].setdefault(uid, []).append(offset)
+        index['ev'].setdefault(ev, []).append(offset)
+        if uid not in meta['uids']:
+            meta['uids'].append(uid)
+        if ev not in meta['evs']:
+            meta['evs'].append(ev)
+        if meta['count'] >= self.segment_events:
+            self._seal_active()
+        return True
+
+    def commit(self):
+        """Make appended events durable and visible to readers."""
+        if not self._dirty:
+            return
+        self.blobs.flush()
+        if self._active is not None:
+            meta, handle, index = self._active
+            handle.flush()
+            _write_json(self.root / f"{meta['name']}.idx.json", index)
+        _write_json(self.manifest_path, self.manifest)
+        self._dirty = False
+
+    def _pending_files(self, path, source):
+        """``(file, offset)`` pairs still to read for ``path``, oldest first.
+
+        Like ``log_profiler._pending_files`` the source is tracked by
+        device/inode: after ``rotate_log`` the rest of ``path.1`` is read
+        before the new ``path``, and a replaced file is never resumed at the
+        old offset just because it already grew past it.
+        """
+        if 'ino' not in source:  # manifest antiguo: solo offset
+            size = path.stat().st_size
+            return [(path, source['offset'] if size >= source['offset'] else 0)]
+        chain = [Path(name) for name in rotated_chain(str(path))]
+        for i, candidate in enumerate(chain):
+            st = candidate.stat()
+            if (st.st_dev, st.st_ino) == (source['dev'], source['ino']):
+                offset = source['offset'] if st.st_size >= source['offset'] else 0
+                return [(candidate, offset)] + [(name, 0) for name in chain[i + 1:]]
+        return [(path, 0)]
+
+    def ingest(self, path, batch=5000):
+        """Append the lines of ``path`` not ingested yet; returns the number of events added.
+
+        The byte offset and device/inode per source are kept in the manifest
+        (rotated or replaced files are detected by inode), so re-running is
+        incremental.
+        """
+        path = Path(path)
+        key = str(path.resolve())
+        source = self.manifest['sources'].get(key, {'offset': 0})
+        state = source
+        added = 0
+        for current, offset in self._pending_files(path, source):
+            st = current.stat()
+            state = {'offset': offset, 'dev': st.st_dev, 'ino': st.st_ino}
+            with open(current, 'rb') as handle:
+                handle.seek(offset)
+                for raw in handle:
+                    if not raw.endswith(b'\n') and current == path:
+                        break  # línea aún en escritura
+                    state['offset'] += len(raw)
+                    self.manifest['raw_bytes'] += len(raw)
+                    text = raw.decode('utf-8', 'replace').strip()
+                    if not text:
+                        continue
+                    try:
+                        event = json.loads(text)
+                    except ValueError:
+                        continue
+                    if isinstance(event, dict) and self.append(event):
+                        added += 1
+                        if added % batch == 0:
+                            self.manifest['sources'][key] = dict(state)
+                            self.commit()
+        if state != source:
+            self.manifest['sources'][key] = state
+            self._dirty = True
+        self.commit()
+        return added
+
+    def close(self):
+        self.commit()
+        self._seal_active()
+        self.blobs.close()
+
+    # ------------------------------------------------------------------- read
+
+    def resolve(self, value):
+        if isinstance(value, dict):
+            if len(value) == 1 and '$ref' in value:
+                return self.resolve(self.blobs.get(value['$ref']))
+            return {_unescape_key(k): self.resolve(v) for k, v in value.items()}
+        if isinstance(value, list):
+            return [self.resolve(v) for v in value]
+        return value
+
+    def _reload(self):
+        if self.manifest_path.exists() and not self._dirty and self._active is None:
+            self.manifest = json.loads(self.manifest_path.read_text(encoding='utf-8'))
+
+    def _candidates(self, meta, uid, ev, since, until):
+        if meta['count'] == 0:
+            return None
+        if since is not None and meta['max_ts'] < since:
+            return None
+        if until is not None and meta['min_ts'] > until:
+            return None
+        evs = None
+        if ev is not None:
+            evs = [name for name in meta['evs'] if name == ev or name.startswith(ev + ':')]
+            if not evs:
+                return None
+        if uid is not None and uid not in meta['uids']:
+            return None
+        if evs is None and uid is None:
+            return ...  # todo el segmento
+        index = json.loads((self.root / f"{meta['name']}.idx.json").read_text(encoding='utf-8'))
+        offsets = None
+        if evs is not None:
+            offsets = set()
+            for name in evs:
+                offsets.update(index['ev'].get(name, ()))
+        if uid is not None:
+            by_uid = set(index['uid'].get(uid, ()))
+            offsets = by_uid if offsets is None else offsets & by_uid
+        return sorted(offsets)
+
+    def _scan(self, meta, offsets, since, until, start=0):
+        path = self.root / f"{meta['name']}.jsonl"
+        size = meta['size']
+        if size <= start:
+            return
+        with open(path, 'rb') as handle, mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ) as view:
+            if offsets is ...:
+                positions = []
+                pos = start
+                while pos < size:
+                    end = view.find(b'\n', pos, size)
+                    positions.append(pos)
+                    pos = size if end < 0 else end + 1
+            else:
+                positions = [o for o in offsets if o >= start]
+            for pos in positions:
+                end = view.find(b'\n', pos, size)
+                record = json.loads(view[pos:size if end < 0 else end].decode('utf-8'))
+                ts = record.get('_t')
+                if since is not None and ts < since:
+                    continue
+                if until is not None and ts > until:
+                    continue
+                yield record
+
+    def query(self, uid=None, ev=None, since=None, until=None, resolve=True):
+        """Yield events matching every given filter, oldest segment first.
+
+        ``ev`` matches the exact name or a ``prefix:`` family, so
+        ``ev='settings_get'`` returns both ``settings_get:row`` and
+        ``settings_get:response``.
+        """
+        self._reload()
+        uid = None if uid is None else str(uid)
+        since, until = parse_time(since), parse_time(until)
+        for meta in list(self.manifest['segments']):
+            offsets = self._candidates(meta, uid, ev, since, until)
+            if offsets is None:
+                continue
+            for record in self._scan(meta, offsets, since, until):
+                yield self._finish(record, resolve)
+
+    def follow(self, uid=None, ev=None, since=None, interval=1.0, resolve=True):
+        """Like ``query`` without an upper bound, then keep yielding new matches."""
+        self._reload()
+        uid = None if uid is None else str(uid)
+        since = parse_time(since)
+        seen = {}
+        while True:
+            for meta in list(self.manifest['segments']):
+                start = seen.get(meta['name'], 0)
+                if meta['size'] <= start:
+                    continue
+                seen[meta['name']] = meta['size']
+                offsets = self._candidates(meta, uid, ev, since, None)
+                if offsets is None:
+                    continue
+                for record in self._scan(meta, offsets, since, None, start):
+                    yield self._finish(record, resolve)
+            time.sleep(interval)
+            self._reload()
+
+    def _finish(self, record, resolve):
+        record = dict(record)
+        record.pop('_t', None)
+        return self.resolve(record) if resolve else record
+
+    def stats(self):
+        self._reload()
+        segments = self.manifest['segments']
+        stored = sum(s['size'] for s in segments)
+        blob_bytes = self.blobs.data_path.stat().st_size if self.blobs.data_path.exists() else 0
+        return {
+            'events': sum(s['count'] for s in segments),
+            'segments': len(segments),
+            'blobs': len(self.blobs.index),
+            'raw_bytes': self.manifest.get('raw_bytes', 0),
+            'stored_bytes': stored + blob_bytes,
+        }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compacted event store for prefs.log / requests.jsonl.')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p_ingest = sub.add_parser('ingest', help='append new lines of JSONL logs')
+    p_ingest.add_argument('store')
+    p_ingest.add_argument('sources', nargs='+')
+
+    p_query = sub.add_parser('query', help='print matching events as JSONL')
+    p_query.add_argument('store')
+    p_query.add_argument('--uid')
+    p_query.add_argument('--ev', help='event name or family prefix (settings_get)')
+    p_query.add_argument('--since', help='epoch, ISO-8601 or age like 1h / 30m')
+    p_query.add_argument('--until')
+    p_query.add_argument('--raw', action='store_true', help='keep $ref placeholders')
+    p_query.add_argument('--follow', action='store_true', help='keep waiting for new events')
+
+    p_stats = sub.add_parser('stats', help='size and dedup summary')
+    p_stats.add_argument('store')
+
+    args = parser.parse_args(argv)
+    store = EventStore(args.store)
+    try:
+        if args.command == 'ingest':
+            for source in args.sources:
+                print(f'{source}: +{store.ingest(source)} eventos')
+            print(json.dumps(store.stats()))
+        elif args.command == 'stats':
+            print(json.dumps(store.stats(), indent=2))
+        else:
+            if args.follow:
+                events = store.follow(args.uid, args.ev, args.since, resolve=not args.raw)
+            else:
+                events = store.query(args.uid, args.ev, args.since, args.until, resolve=not args.raw)
+            for event in events:
+                print(_dumps(event), flush=args.follow)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        store.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
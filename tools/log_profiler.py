@@ -0,0 +1,368 @@
+"""Step-latency profiler for ``clean_log`` logs.
+
+Reads ``api/logs/ai_extract_debug_*.log`` / ``data/debug_*.log`` style files
+(``[YYYY-MM-DD HH:MM:SS] mensaje``) line by line, splits them into runs at
+``=== INICIO EXTRACCIÓN ...`` and reports p50/p95/p99 per stage, per provider
+operation and per user (total run time).
+
+- Stage: starts at a line matching ``STAGE_RULES`` (``PASO 7.1``,
+  ``CHEQUEO 4``, ``FILE_ID verificado``, ``ASSISTANT_ID existente``, ...)
+  and lasts until the next line with a different stage label or the end of
+  the run.
+- Provider operation: ``OP <op>: Preparando request`` -> ``OP <op>:
+  Respuesta recibida`` / ``HTTP inesperado`` pairs from
+  ``executeOpsOperation`` (case-insensitive), plus lines matching
+  ``OP_RULES``, timed from the previous log line.
+
+Memory stays bounded: only the current run per log is held, and latencies go
+into value -> count histograms (timestamps have one-second resolution, so the
+number of distinct values is small and percentiles are exact).
+
+Backups written by ``rotate_log()`` (``file.log.1`` ... ``file.log.N``) are
+read oldest first together with their base file. With ``--state`` only the
+bytes appended since the previous invocation are parsed, following the file
+across rotations; the open run and the histograms are kept in the state file.
+
+Usage::
+
+    python -m tools.log_profiler api/logs/ai_extract_debug_*.log data/debug_*.log
+    python -m tools.log_profiler api/logs/*.log --state .log_profiler.json --json [--flush]
+"""
+
+import argparse
+import glob
+import json
+import os
+import re
+import sys
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+
+RUN_START = '=== INICIO EXTRACCI'
+LINE_RE = re.compile(r'^\[(\d{4}-\d\d-\d\d[ T]\d\d:\d\d:\d\d(?:\.\d+)?)\] ?(.*)$')
+USER_RE = re.compile(r'Usuario autenticado(?::| - ID=)\s*(\d+)')
+# executeOpsOperation() escribe "Preparando request", "Respuesta recibida" y "HTTP inesperado".
+OP_START_RE = re.compile(r'^OP (\S+): preparando request', re.I)
+OP_END_RE = re.compile(r'^OP (\S+): (?:respuesta|http inesperado)', re.I)
+
+STAGE_RULES = [
+    (re.compile(r'^(PASO \d+(?:\.\d+)*)'), None),
+    (re.compile(r'(CHEQUEO \d+)'), None),
+    (re.compile(r'^((?:FILE|VS|ASSISTANT|THREAD)_ID) (existente|verificado|faltante|creado|válido|existe)'), None),
+    (re.compile(r'^(Verificando estado del último run|Estado del run|Run creado)'), 'RUN'),
+    (re.compile(r'^(Verificando mensajes del asistente|Texto del asistente encontrado)'), 'MENSAJES'),
+]
+OP_RULES = [
+    (re.compile(r'^((?:FILE|VS|ASSISTANT|THREAD)_ID) verificado en OpenAI'), r'\1 get'),
+    (re.compile(r'^(Assistant|VS) Result completo'), r'\1 create'),
+    (re.compile(r'^Run creado'), 'run.create'),
+    (re.compile(r'^Estado del run'), 'run.get'),
+]
+
+_ts_cache = {}
+
+
+def parse_ts(value):
+    ts = _ts_cache.get(value)
+    if ts is None:
+        if len(_ts_cache) > 4096:
+            _ts_cache.clear()
+        ts = _ts_cache[value] = datetime.fromisoformat(value).timestamp()
+    return ts
+
+
+def stage_of(message):
+    for pattern, label in STAGE_RULES:
+        match = pattern.search(message)
+        if match:
+            return label or ' '.join(g for g in match.groups() if g)
+    return None
+
+
+def op_of(message):
+    for pattern, name in OP_RULES:
+        match = pattern.search(message)
+        if match:
+            return match.expand(name)
+    return None
+
+
+class Histogram:
+    """Exact value -> count histogram (values rounded to milliseconds)."""
+
+    def __init__(self, counts=None):
+        self.counts = Counter(counts or {})
+
+    def add(self, value):
+        self.counts[round(value, 3)] += 1
+
+    @property
+    def total(self):
+        return sum(self.counts.values())
+
+    def percentile(self, p):
+        total = self.total
+        if not total:
+            return None
+        rank = max(1, -(-total * p // 100))  # nearest-rank
+        seen = 0
+        for value in sorted(self.counts):
+            seen += self.counts[value]
+            if seen >= rank:
+                return value
+        return None
+
+    def to_json(self):
+        return {repr(k): v for k, v in self.counts.items()}
+
+    @classmethod
+    def from_json(cls, data):
+        return cls({float(k): v for k, v in data.items()})
+
+
+class Stats:
+    GROUPS = ('stage', 'op', 'user')
+
+    def __init__(self):
+        self.runs = 0
+        self.groups = {g: {} for g in self.GROUPS}
+
+    def add(self, group, key, value):
+        hist = self.groups[group].get(key)
+        if hist is None:
+            hist = self.groups[group][key] = Histogram()
+        hist.add(max(0.0, value))
+
+    def to_json(self):
+        return {
+            'runs': self.runs,
+            **{g: {k: h.to_json() for k, h in self.groups[g].items()} for g in self.GROUPS},
+        }
+
+    @classmethod
+    def from_json(cls, data):
+        stats = cls()
+        stats.runs = data.get('runs', 0)
+        for g in cls.GROUPS:
+            stats.groups[g] = {k: Histogram.from_json(v) for k, v in data.get(g, {}).items()}
+        return stats
+
+    def report(self):
+        rows = {}
+        for g in self.GROUPS:
+            rows[g] = {
+                key: {
+                    'n': hist.total,
+                    'p50': hist.percentile(50),
+                    'p95': hist.percentile(95),
+                    'p99': hist.percentile(99),
+                }
+                for key, hist in sorted(self.groups[g].items())
+            }
+        return {'runs': self.runs, **rows}
+
+
+class RunParser:
+    """Incremental parser for one log chain; ``run`` is JSON-serializable."""
+
+    def __init__(self, stats, run=None):
+        self.stats = stats
+        self.run = run
+
+    def feed(self, line):
+        match = LINE_RE.match(line)
+        if not match:
+            return  # continuación de un mensaje multilínea
+        ts, message = parse_ts(match.group(1)), match.group(2)
+        if message.startswith(RUN_START):
+            self.finish()
+            self.run = self._new_run(ts)
+        run = self.run
+        stage = stage_of(message)
+        if run is None:
+            if stage is None:
+                return
+            run = self.run = self._new_run(ts)
+
+        user = USER_RE.search(message)
+        if user and run['user'] is None:
+            run['user'] = user.group(1)
+
+        op_start = OP_START_RE.match(message)
+        if op_start:
+            # PHP escribe dos líneas "Preparando request" por llamada: cuenta la primera.
+            run['ops'].setdefault(op_start.group(1), ts)
+        else:
+            op_end = OP_END_RE.match(message)
+            if op_end and op_end.group(1) in run['ops']:
+                name = op_end.group(1)
+                self.stats.add('op', name, ts - run['ops'].pop(name))
+                paired = run.setdefault('paired', [])
+                if name not in paired:
+                    paired.append(name)
+            elif not op_end:
+                op = op_of(message)
+                # Las reglas solo estiman ops que no llegan con su par Preparando/Respuesta.
+                if op and op not in run.get('paired', ()):
+                    self.stats.add('op', op, ts - run['last'])
+
+        if stage and stage != run['stage']:
+            self._close_stage(ts)
+            run['stage'], run['stage_ts'] = stage, ts
+        run['last'] = ts
+
+    def finish(self):
+        run = self.run
+        if run is None:
+            return
+        self._close_stage(run['last'])
+        self.stats.add('user', run['user'] or '?', run['last'] - run['start'])
+        self.stats.runs += 1
+        self.run = None
+
+    def _close_stage(self, ts):
+        run = self.run
+        if run['stage'] is not None:
+            self.stats.add('stage', run['stage'], ts - run['stage_ts'])
+            run['stage'] = None
+
+    @staticmethod
+    def _new_run(ts):
+        return {'start': ts, 'last': ts, 'user': None, 'stage': None, 'stage_ts': ts, 'ops': {}}
+
+
+def rotated_chain(base, backups=9):
+    """Existing ``base.N`` ... ``base.1`` (oldest first) followed by ``base``."""
+    chain = [f'{base}.{i}' for i in range(backups, 0, -1) if os.path.isfile(f'{base}.{i}')]
+    return chain + [base] if os.path.isfile(base) else chain
+
+
+def iter_lines(path, offset=0, complete_only=False):
+    """Yield decoded lines from ``offset``; returns the offset after the last one consumed.
+
+    With ``complete_only`` a trailing line without newline is left for later
+    (the PHP side may still be writing it).
+    """
+    with open(path, 'rb') as handle:
+        handle.seek(offset)
+        pos = offset
+        for raw in handle:
+            if complete_only and not raw.endswith(b'\n'):
+                break
+            pos += len(raw)
+            yield raw.decode('utf-8', 'replace').rstrip('\r\n')
+    return pos
+
+
+def _consume(parser, path, offset, complete_only):
+    gen = iter_lines(path, offset, complete_only)
+    while True:
+        try:
+            parser.feed(next(gen))
+        except StopIteration as stop:
+            return stop.value
+
+
+def _pending_files(base, saved):
+    """Files (with start offsets) holding bytes not seen in the previous pass."""
+    chain = rotated_chain(base)
+    if not saved:
+        return [(p, 0) for p in chain]
+    for i, path in enumerate(chain):
+        st = os.stat(path)
+        if (st.st_dev, st.st_ino) == (saved['dev'], saved['ino']):
+            offset = saved['offset'] if st.st_size >= saved['offset'] else 0
+            return [(path, offset)] + [(p, 0) for p in chain[i + 1:]]
+    # El archivo visto ya salió de la rotación: todo lo que queda es nuevo.
+    return [(p, 0) for p in chain]
+
+
+def profile(bases, state=None, flush=False):
+    """Parse ``bases`` (base log paths) and return ``(Stats, new_state)``.
+
+    ``state`` is the dict returned by a previous call; when given, only new
+    bytes are parsed and open runs stay open for the next call unless
+    ``flush`` closes them now.
+    """
+    incremental = state is not None
+    state = state or {}
+    stats = Stats.from_json(state.get('stats', {}))
+    files = dict(state.get('files', {}))
+    open_runs = dict(state.get('open', {}))
+
+    for base in bases:
+        parser = RunParser(stats, open_runs.pop(base, None))
+        pending = _pending_files(base, files.get(base)) if incremental else [(p, 0) for p in rotated_chain(base)]
+        offset, path = 0, None
+        for path, start in pending:
+            offset = _consume(parser, path, start, incremental and path == base)
+        if incremental:
+            if path == base:
+                st = os.stat(base)
+                files[base] = {'dev': st.st_dev, 'ino': st.st_ino, 'offset': offset}
+            if flush:
+                parser.finish()
+            elif parser.run is not None:
+                open_runs[base] = parser.run
+        else:
+            parser.finish()
+
+    new_state = {'stats': stats.to_json(), 'files': files, 'open': open_runs}
+    return stats, new_state
+
+
+def expand_inputs(patterns):
+    bases = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern)) or [pattern]
+        for path in matches:
+            # Los backups .1/.2/... se leen junto a su archivo base.
+            base = re.sub(r'\.\d+$', '', path)
+            if base not in bases:
+                bases.append(base)
+    return bases
+
+
+def format_report(report):
+    lines = [f"runs: {report['runs']}"]
+    titles = {'stage': 'etapa', 'op': 'operación', 'user': 'usuario (run total)'}
+    for group in Stats.GROUPS:
+        rows = report[group]
+        if not rows:
+            continue
+        width = max(len(titles[group]), *(len(k) for k in rows))
+        lines.append('')
+        lines.append(f"{titles[group]:<{width}}  {'n':>6}  {'p50':>8}  {'p95':>8}  {'p99':>8}")
+        for key, row in sorted(rows.items(), key=lambda kv: -(kv[1]['p95'] or 0)):
+            lines.append(
+                f"{key:<{width}}  {row['n']:>6}  {row['p50']:>8.3f}  {row['p95']:>8.3f}  {row['p99']:>8.3f}"
+            )
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Per-stage latency report for clean_log logs.')
+    parser.add_argument('logs', nargs='+', help='log files or glob patterns')
+    parser.add_argument('--state', help='state file for incremental runs')
+    parser.add_argument('--flush', action='store_true', help='with --state, close runs still open')
+    parser.add_argument('--json', action='store_true', help='print the report as JSON')
+    args = parser.parse_args(argv)
+
+    state = None
+    if args.state:
+        state_path = Path(args.state)
+        state = json.loads(state_path.read_text(encoding='utf-8')) if state_path.exists() else {}
+    stats, new_state = profile(expand_inputs(args.logs), state, args.flush)
+    if args.state:
+        tmp = Path(args.state + '.tmp')
+        tmp.write_text(json.dumps(new_state), encoding='utf-8')
+        os.replace(tmp, args.state)
+
+    report = stats.report()
+    print(json.dumps(report, ensure_ascii=False, indent=2) if args.json else format_report(report))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
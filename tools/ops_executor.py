@@ -0,0 +1,588 @@
+"""Concurrent executor for the operations defined in ``doc/ops_json.json``.
+
+Python counterpart of ``executeOpsOperation()`` (``api/ai_extract_file_vs_correct.php``)
+for running many provider calls at once:
+
+- same op spec: ``{{VAR}}`` templating of URL, headers, body and multipart
+  fields, ``defaults``, ``required_fields``, ``body_type: multipart``,
+  ``expected_status`` and ``ok_json_path`` / ``ok_json_expected``; values
+  placed in a JSON body are escaped, so prompts with quotes or newlines
+  stay valid JSON;
+- asyncio with a keep-alive connection pool per host (stdlib streams, no
+  extra dependencies) instead of one cURL handle per call;
+- a concurrency limit per provider host (``--limit api.openai.com=8``);
+- ``vs.attach`` calls for the same ``VS_ID`` and ``API_KEY`` that arrive
+  within ``batch_window`` seconds are sent as a single ``vs.attach_batch``;
+  each caller still gets a ``vector_store.file`` for its own ``FILE_ID``,
+  with the batch ``status`` and its id in ``batch_id``.
+
+``mock`` serves a local imitation of the OpenAI endpoints used by the ops;
+``tools/tests/test_ops_executor.py`` runs the executor against it.
+
+Usage::
+
+    python -m tools.ops_executor run vs.store.get -p VS_ID=vs_123 --api-key "$OPENAI_API_KEY"
+    python -m tools.ops_executor batch calls.jsonl --limit api.openai.com=8   # {"op": ..., "params": {...}} por línea
+    python -m tools.ops_executor mock --port 8770
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import re
+import socket
+import ssl
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import urlsplit
+
+DEFAULT_OPS = Path(__file__).resolve().parent.parent / 'doc' / 'ops_json.json'
+MAX_RESPONSE = 10 * 1024 * 1024  # igual que executeOpsOperation()
+MAX_BATCH = 500  # límite de file_ids por file_batch en OpenAI
+PLACEHOLDER_RE = re.compile(r'\{\{(\w+)\}\}')
+IDEMPOTENT = frozenset({'GET', 'HEAD', 'PUT', 'DELETE', 'OPTIONS'})
+
+
+class OpsError(Exception):
+    """Failed operation; ``status`` is the HTTP code when there was a response."""
+
+    def __init__(self, op, message, status=None):
+        super().__init__(f'{op}: {message}')
+        self.op = op
+        self.status = status
+
+
+def load_ops(path=DEFAULT_OPS):
+    with open(path, encoding='utf-8') as handle:
+        return json.load(handle)
+
+
+def _as_text(value):
+    # (string)$value de PHP; listas y dicts van como JSON (p. ej. FILE_IDS_JSON).
+    if value is None or value is False:
+        return ''
+    if value is True:
+        return '1'
+    if isinstance(value, (list, dict)):
+        return json.dumps(value, separators=(',', ':'))
+    return str(value)
+
+
+def _as_json_text(value):
+    # Dentro de un cuerpo JSON los placeholders van entre comillas: se escapan.
+    # Listas y dicts ya son JSON y se insertan tal cual (p. ej. FILE_IDS_JSON).
+    if isinstance(value, (list, dict)):
+        return _as_text(value)
+    return json.dumps(_as_text(value), ensure_ascii=False)[1:-1]
+
+
+def render(template, params, as_text=_as_text):
+    """Replace ``{{KEY}}`` for every key in ``params``; unknown placeholders stay."""
+    return PLACEHOLDER_RE.sub(lambda m: as_text(params[m.group(1)]) if m.group(1) in params else m.group(0), template)
+
+
+def json_path(data, path):
+    for part in path.split('.'):
+        if isinstance(data, dict):
+            data = data.get(part)
+        elif isinstance(data, list) and part.isdigit() and int(part) < len(data):
+            data = data[int(part)]
+        else:
+            return None
+    return data
+
+
+class Prepared:
+    __slots__ = ('op', 'method', 'url', 'headers', 'body', 'host')
+
+    def __init__(self, op, method, url, headers, body):
+        self.op, self.method, self.url, self.headers, self.body = op, method, url, headers, body
+        self.host = urlsplit(url).netloc
+
+
+def _multipart(fields, params, op):
+    boundary = uuid.uuid4().hex
+    parts = []
+    for field in fields:
+        name = field['name']
+        value = render(str(field.get('value', '')), params)
+        if field.get('type', 'text') == 'file':
+            if not os.path.isfile(value):
+                raise OpsError(op, f'Archivo no encontrado: {value}')
+            filename = params.get('FILE_NAME') or os.path.basename(value)
+            head = (f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+                    'Content-Type: application/octet-stream\r\n\r\n')
+            parts += [head.encode('utf-8'), Path(value).read_bytes(), b'\r\n']
+        else:
+            head = f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n'
+            parts += [head.encode('utf-8'), value.encode('utf-8'), b'\r\n']
+    parts.append(f'--{boundary}--\r\n'.encode('ascii'))
+    return b''.join(parts), f'multipart/form-data; boundary={boundary}'
+
+
+def prepare(ops, name, params, api_key='', base_url=None):
+    """Build the request for op ``name`` (raises ``OpsError`` like the PHP version)."""
+    spec = ops.get('multi', {}).get(name)
+    if spec is None:
+        raise OpsError(name, "operación no encontrada en ops_json")
+    if 'pipeline' in spec or not spec.get('url_override'):
+        raise OpsError(name, 'la operación no es una llamada HTTP')
+    params = {**spec.get('defaults', {}), **params}
+    params.setdefault('API_KEY', api_key)
+    missing = [f for f in spec.get('required_fields', []) if _as_text(params.get(f)) == '']
+    if missing:
+        raise OpsError(name, f"faltan campos requeridos: {', '.join(missing)}")
+
+    url = render(spec['url_override'], params)
+    if base_url:
+        parts = urlsplit(url)
+        url = base_url.rstrip('/') + parts.path + (f'?{parts.query}' if parts.query else '')
+    if urlsplit(url).scheme not in ('http', 'https') or not urlsplit(url).netloc:
+        raise OpsError(name, f'URL inválida o vacía: {url[:100]}')
+
+    headers = [(h['name'], render(str(h['value']), params)) for h in spec.get('headers', [])]
+    body = None
+    if spec.get('body_type') == 'multipart':
+        body, content_type = _multipart(spec.get('multipart', []), params, name)
+        headers = [(k, v) for k, v in headers if k.lower() != 'content-type'] + [('Content-Type', content_type)]
+    elif 'body' in spec:
+        as_text = _as_json_text if spec['body'].lstrip().startswith(('{', '[')) else _as_text
+        body = render(spec['body'], params, as_text).encode('utf-8')
+    return Prepared(name, spec.get('method', 'GET'), url, headers, body)
+
+
+def check_response(spec, name, status, payload):
+    """Apply ``expected_status``, JSON decoding and ``ok_json_path`` rules."""
+    text = payload.decode('utf-8', 'replace').strip()
+    if status != spec.get('expected_status', 200):
+        detail = text
+        try:
+            detail = json.loads(text)['error']['message']
+        except (ValueError, KeyError, TypeError):
+            pass
+        raise OpsError(name, f'HTTP {status}: {detail[:500]}', status)
+    if not text:
+        return []
+    if len(text) > MAX_RESPONSE:
+        raise OpsError(name, 'respuesta del proveedor demasiado grande', status)
+    try:
+        data = json.loads(text)
+    except ValueError as exc:
+        raise OpsError(name, f'respuesta del proveedor no es válida: {exc}', status) from None
+    if data is not None and not isinstance(data, (dict, list)):
+        raise OpsError(name, 'formato de respuesta inesperado del proveedor', status)
+    path = spec.get('ok_json_path')
+    if path:
+        value = json_path(data, path)
+        expected = spec.get('ok_json_expected', 'exists')
+        if (expected == 'array' and not isinstance(value, list)) or (expected != 'array' and value is None):
+            raise OpsError(name, f"'{path}' no cumple '{expected}'", status)
+    return data
+
+
+class _StaleConnection(ConnectionResetError):
+    """Pooled connection dropped before any byte of the response arrived."""
+
+
+class ConnectionPool:
+    """HTTP/1.1 keep-alive connections over asyncio streams, pooled per host."""
+
+    def __init__(self, timeout=30.0):
+        self.timeout = timeout
+        self._idle = {}
+        self._ssl = ssl.create_default_context()
+        self.opened = 0
+        self.reused = 0
+
+    async def _connect(self, scheme, host, port):
+        self.opened += 1
+        reader, writer = await asyncio.open_connection(host, port, ssl=self._ssl if scheme == 'https' else None)
+        sock = writer.get_extra_info('socket')
+        if sock is not None:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return reader, writer
+
+    async def request(self, method, url, headers, body=None):
+        parts = urlsplit(url)
+        port = parts.port or (443 if parts.scheme == 'https' else 80)
+        key = (parts.scheme, parts.hostname, port)
+        target = (parts.path or '/') + (f'?{parts.query}' if parts.query else '')
+        lines = [f'{method} {target} HTTP/1.1', f'Host: {parts.netloc}', 'Connection: keep-alive',
+                 'Accept-Encoding: identity']
+        lines += [f'{k}: {v}' for k, v in headers]
+        if body is not None or method in ('POST', 'PUT', 'PATCH'):
+            lines.append(f'Content-Length: {len(body or b"")}')
+        raw = ('\r\n'.join(lines) + '\r\n\r\n').encode('utf-8') + (body or b'')
+
+        idle = self._idle.setdefault(key, [])
+        while idle:
+            conn = idle.pop()
+            if conn[1].is_closing():
+                continue
+            self.reused += 1
+            try:
+                return await asyncio.wait_for(self._exchange(key, conn, raw, method), self.timeout)
+            except (ConnectionError, asyncio.IncompleteReadError) as exc:
+                conn[1].close()
+                # Conexión inactiva cerrada por el servidor: se reintenta con una nueva. Si ya
+                # llegó parte de la respuesta, el servidor la procesó y solo se repite si es idempotente.
+                if not isinstance(exc, _StaleConnection) and method not in IDEMPOTENT:
+                    raise
+        conn = await asyncio.wait_for(self._connect(*key), self.timeout)
+        return await asyncio.wait_for(self._exchange(key, conn, raw, method), self.timeout)
+
+    async def _exchange(self, key, conn, raw, method):
+        reader, writer = conn
+        received = False
+        try:
+            writer.write(raw)
+            await writer.drain()
+            while True:
+                status_line = await reader.readline()
+                if not status_line:
+                    raise ConnectionResetError('conexión cerrada')
+                received = True
+                version, status = status_line.split(b' ', 2)[:2]
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    k, _, v = line.decode('latin-1').partition(':')
+                    headers[k.strip().lower()] = v.strip()
+                if not 100 <= int(status) < 200:
+                    break
+            status = int(status)
+            keep = version == b'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+            if method == 'HEAD' or status in (204, 304):
+                payload = b''
+            elif headers.get('transfer-encoding', '').lower() == 'chunked':
+                chunks = []
+                while True:
+                    size = int((await reader.readline()).split(b';')[0], 16)
+                    if not size:
+                        while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                            pass
+                        break
+                    chunks.append(await reader.readexactly(size + 2))
+                payload = b''.join(c[:-2] for c in chunks)
+            elif 'content-length' in headers:
+                payload = await reader.readexactly(int(headers['content-length']))
+            else:
+                payload, keep = await reader.read(), False
+        except BaseException as exc:
+            writer.close()
+            if not received and isinstance(exc, ConnectionError):
+                raise _StaleConnection(str(exc)) from exc
+            raise
+        if keep:
+            self._idle.setdefault(key, []).append(conn)
+        else:
+            writer.close()
+        return status, headers, payload
+
+    def close(self):
+        for conns in self._idle.values():
+            for _, writer in conns:
+                writer.close()
+        self._idle.clear()
+
+
+def _batched_file(batch, params):
+    """``vector_store.file`` for one ``FILE_ID`` of a ``vector_store.file_batch`` response."""
+    return {
+        'id': params['FILE_ID'], 'object': 'vector_store.file',
+        'vector_store_id': batch.get('vector_store_id', params['VS_ID']),
+        'status': batch.get('status'), 'batch_id': batch.get('id'),
+    }
+
+
+class OpsExecutor:
+    """Run ops concurrently: ``await executor.call('vs.get', {'FILE_ID': ...})``."""
+
+    def __init__(self, ops, api_key='', limits=None, default_limit=4, batch_window=0.02,
+                 base_url=None, timeout=30.0):
+        self.ops = ops
+        self.api_key = api_key
+        self.limits = dict(limits or {})
+        self.default_limit = default_limit
+        self.batch_window = batch_window
+        self.base_url = base_url
+        self.pool = ConnectionPool(timeout)
+        self._sems = {}
+        self._pending = {}
+        self.stats = {'calls': 0, 'requests': 0, 'batched': 0}
+
+    def _sem(self, host):
+        sem = self._sems.get(host)
+        if sem is None:
+            sem = self._sems[host] = asyncio.Semaphore(self.limits.get(host, self.default_limit))
+        return sem
+
+    async def _execute(self, name, params):
+        req = prepare(self.ops, name, params, self.api_key, self.base_url)
+        async with self._sem(req.host):
+            self.stats['requests'] += 1
+            try:
+                status, _, payload = await self.pool.request(req.method, req.url, req.headers, req.body)
+            except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError) as exc:
+                raise OpsError(name, f'error de conexión: {exc!r}') from None
+        return check_response(self.ops['multi'][name], name, status, payload)
+
+    async def call(self, name, params=None):
+        params = dict(params or {})
+        self.stats['calls'] += 1
+        if name == 'vs.attach' and 'vs.attach_batch' in self.ops.get('multi', {}) and params.get('VS_ID'):
+            return await self._attach(params)
+        return await self._execute(name, params)
+
+    async def _attach(self, params):
+        if _as_text(params.get('FILE_ID')) == '':
+            raise OpsError('vs.attach', 'faltan campos requeridos: FILE_ID')
+        key = (params['VS_ID'], params.get('API_KEY', self.api_key))  # cada dueño con su clave
+        future = asyncio.get_running_loop().create_future()
+        group = self._pending.get(key)
+        if group is None:
+            group = self._pending[key] = []
+            asyncio.get_running_loop().call_later(self.batch_window, self._flush, key)
+        group.append((params, future))
+        if len(group) >= MAX_BATCH:
+            self._flush(key)
+        return await future
+
+    def _flush(self, key):
+        group = self._pending.pop(key, None)
+        if group:
+            asyncio.ensure_future(self._send_attach(group))
+
+    async def _send_attach(self, group):
+        params = group[0][0]
+        try:
+            if len(group) == 1:
+                results = [await self._execute('vs.attach', params)]
+            else:
+                file_ids = list(dict.fromkeys(p['FILE_ID'] for p, _ in group))
+                self.stats['batched'] += len(group)
+                batch = await self._execute('vs.attach_batch', {**params, 'FILE_IDS_JSON': file_ids})
+                results = [_batched_file(batch, p) for p, _ in group]
+        except Exception as exc:
+            for _, future in group:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+        for (_, future), result in zip(group, results):
+            if not future.done():
+                future.set_result(result)
+
+    async def gather(self, calls):
+        """Run ``[(op, params), ...]``; errors are returned in place of results."""
+        return await asyncio.gather(*(self.call(op, params) for op, params in calls), return_exceptions=True)
+
+    def close(self):
+        self.pool.close()
+
+
+# ---------------------------------------------------------------------- mock
+
+class MockOpenAIHandler(BaseHTTPRequestHandler):
+    """Minimal imitation of the OpenAI endpoints referenced by ``ops_json``."""
+
+    protocol_version = 'HTTP/1.1'
+    ROUTES = [
+        ('POST', r'/v1/files', 'file.upload'),
+        ('GET', r'/v1/files', 'file.list'),
+        ('GET', r'/v1/files/(?P<id>[^/]+)', 'file.get'),
+        ('DELETE', r'/v1/files/(?P<id>[^/]+)', 'file.delete'),
+        ('POST', r'/v1/vector_stores', 'vs.create'),
+        ('GET', r'/v1/vector_stores/(?P<vs>[^/]+)', 'vs.get'),
+        ('POST', r'/v1/vector_stores/(?P<vs>[^/]+)/files', 'vs.attach'),
+        ('GET', r'/v1/vector_stores/(?P<vs>[^/]+)/files', 'vs.files'),
+        ('GET', r'/v1/vector_stores/(?P<vs>[^/]+)/files/(?P<id>[^/]+)', 'vs.file.get'),
+        ('POST', r'/v1/vector_stores/(?P<vs>[^/]+)/file_batches', 'vs.batch'),
+        ('GET', r'/v1/assistants/(?P<id>[^/]+)', 'assistant.get'),
+        ('POST', r'/v1/threads', 'thread.create'),
+        ('POST', r'/v1/threads/(?P<thread>[^/]+)/runs', 'run.create'),
+        ('GET', r'/v1/threads/(?P<thread>[^/]+)/runs/(?P<id>[^/]+)', 'run.get'),
+        ('GET', r'/v1/threads/(?P<thread>[^/]+)/messages', 'messages.list'),
+    ]
+
+    def setup(self):
+        super().setup()
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        with self.server.lock:
+            self.server.connections += 1
+
+    def _route(self, method):
+        path = urlsplit(self.path).path
+        for verb, pattern, name in self.ROUTES:
+            match = re.fullmatch(pattern, path)
+            if verb == method and match:
+                return name, match.groupdict()
+        return None, {}
+
+    def _handle(self, method):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        name, args = self._route(method)
+        with self.server.lock:
+            self.server.hits[name] = self.server.hits.get(name, 0) + 1
+            self.server.auth.setdefault(name, []).append(self.headers.get('Authorization', ''))
+            self.server.active += 1
+            self.server.peak = max(self.server.peak, self.server.active)
+            seq = next(self.server.ids)
+        try:
+            time.sleep(self.server.delay)
+            status, payload = self._respond(name, args, body, seq)
+        finally:
+            with self.server.lock:
+                self.server.active -= 1
+        data = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _respond(self, name, args, body, seq):
+        if not self.headers.get('Authorization', '').startswith('Bearer ') or self.headers['Authorization'] == 'Bearer ':
+            return 401, {'error': {'message': 'Missing API key'}}
+        if name is None:
+            return 404, {'error': {'message': f'Unknown route {self.command} {self.path}'}}
+        if args.get('id', '').startswith('missing') or args.get('vs', '').startswith('missing'):
+            return 404, {'error': {'message': 'No such object'}}
+        if body and 'json' in self.headers.get('Content-Type', ''):
+            try:
+                json.loads(body)
+            except ValueError:
+                return 400, {'error': {'message': 'We could not parse the JSON body of your request.'}}
+        if name == 'file.upload':
+            if b'filename="' not in body:
+                return 400, {'error': {'message': 'file is required'}}
+            return 200, {'id': f'file-{seq}', 'object': 'file', 'bytes': len(body)}
+        if name in ('file.list', 'vs.files'):
+            return 200, {'object': 'list', 'data': []}
+        if name == 'vs.attach':
+            return 200, {'id': json.loads(body)['file_id'], 'object': 'vector_store.file',
+                         'vector_store_id': args['vs'], 'status': 'in_progress'}
+        if name == 'vs.batch':
+            ids = json.loads(body)['file_ids']
+            return 200, {'id': f'vsfb_{seq}', 'object': 'vector_store.file_batch', 'vector_store_id': args['vs'],
+                         'status': 'in_progress', 'file_counts': {'total': len(ids)}}
+        if name == 'vs.file.get':
+            return 200, {'id': args['id'], 'object': 'vector_store.file', 'status': 'completed'}
+        if name == 'vs.create':
+            return 200, {'id': f'vs_{seq}', 'object': 'vector_store'}
+        if name == 'assistant.get':
+            return 200, {'id': args['id'], 'object': 'assistant', 'model': 'gpt-4o-mini'}
+        if name == 'thread.create':
+            thread_id = f'thread_{seq}'
+            with self.server.lock:
+                self.server.threads[thread_id] = json.loads(body)['messages'][0]['content']
+            return 200, {'id': thread_id, 'object': 'thread'}
+        if name in ('run.create', 'run.get'):
+            if args['thread'] not in self.server.threads:
+                return 404, {'error': {'message': 'No thread found'}}
+            return 200, {'id': args.get('id') or f'run_{seq}', 'object': 'thread.run', 'thread_id': args['thread'],
+                         'status': 'queued' if name == 'run.create' else 'completed'}
+        if name == 'messages.list':
+            prompt = self.server.threads.get(args['thread'], '')
+            text = json.dumps({'resumen': prompt.splitlines()[-1] if prompt else '', 'puntos_clave': []},
+                              ensure_ascii=False)
+            return 200, {'object': 'list', 'data': [
+                {'role': 'assistant', 'content': [{'type': 'text', 'text': {'value': text}}]}]}
+        return 200, {'id': args.get('id') or args.get('vs'), 'object': name, 'deleted': self.command == 'DELETE'}
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_POST(self):
+        self._handle('POST')
+
+    def do_DELETE(self):
+        self._handle('DELETE')
+
+    def log_message(self, *args):
+        pass
+
+
+def serve_mock(port=0, delay=0.0):
+    server = ThreadingHTTPServer(('127.0.0.1', port), MockOpenAIHandler)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.hits, server.connections, server.active, server.peak = {}, 0, 0, 0
+    server.auth = {}  # ruta -> cabeceras Authorization recibidas
+    server.threads = {}  # thread_id -> contenido del mensaje del usuario
+    server.ids = itertools.count(1)
+    server.delay = delay
+    return server
+
+
+def _parse_limits(values):
+    limits = {}
+    for item in values or []:
+        host, _, n = item.partition('=')
+        limits[host] = int(n)
+    return limits
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Concurrent executor for ops_json operations.')
+    parser.add_argument('--ops', default=str(DEFAULT_OPS))
+    sub = parser.add_subparsers(dest='command', required=True)
+    for name in ('run', 'batch'):
+        p = sub.add_parser(name)
+        if name == 'run':
+            p.add_argument('op')
+            p.add_argument('-p', '--param', action='append', default=[], help='KEY=VALUE')
+        else:
+            p.add_argument('calls', help='JSONL file with {"op": ..., "params": {...}} per line')
+        p.add_argument('--api-key', default=os.environ.get('OPENAI_API_KEY', ''))
+        p.add_argument('--base-url', help='send requests to this origin instead (e.g. the mock)')
+        p.add_argument('--limit', action='append', default=[], help='HOST=N concurrent requests')
+        p.add_argument('--default-limit', type=int, default=4)
+    p_mock = sub.add_parser('mock')
+    p_mock.add_argument('--port', type=int, default=8770)
+    p_mock.add_argument('--delay', type=float, default=0.0)
+    args = parser.parse_args(argv)
+
+    if args.command == 'mock':
+        server = serve_mock(args.port, args.delay)
+        print(f'mock OpenAI on http://127.0.0.1:{args.port}')
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            server.shutdown()
+        return 0
+
+    if args.command == 'run':
+        calls = [(args.op, dict(p.split('=', 1) for p in args.param))]
+    else:
+        with open(args.calls, encoding='utf-8') as handle:
+            calls = [(c['op'], c.get('params', {})) for c in map(json.loads, filter(str.strip, handle))]
+
+    async def go():
+        executor = OpsExecutor(load_ops(args.ops), args.api_key, _parse_limits(args.limit),
+                               args.default_limit, base_url=args.base_url)
+        try:
+            return await executor.gather(calls)
+        finally:
+            executor.close()
+
+    results = asyncio.run(go())
+    failed = 0
+    for (op, _), result in zip(calls, results):
+        if isinstance(result, Exception):
+            failed += 1
+            result = {'error': str(result)}
+        print(json.dumps({'op': op, 'result': result} if args.command == 'batch' else result, ensure_ascii=False))
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
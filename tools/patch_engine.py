@@ -0,0 +1,315 @@
+"""Declarative multi-block patch engine for the PHP endpoints under ``api/``.
+
+Replaces the one-off ``api/_tmp_*.py`` scripts: instead of one ``text.index``
+scan per marker and one read/write per script, every marker of every edit for
+a file is located in a single multi-pattern pass, all edits are applied in one
+rewrite, and files are processed in parallel with a process pool.
+
+Spec format (JSON)::
+
+    [
+      {"path": "api/ai_extract_file_vs_correct.php",
+       "edits": [{"label": "block A",
+                  "start": "    clean_log(\\"PASO 7.1: ...",
+                  "end": "    clean_log(\\"PASO 7 OK: IDs finales",
+                  "replacement": "...\\n"}]},
+      {"glob": "api/*_safe.php", "edits": [...]}
+    ]
+
+Edit fields:
+
+- ``start`` (required): marker where the replaced span begins.
+- ``end``: marker where it ends. Omitted means only ``start`` itself is
+  replaced (plain ``old -> new`` like ``_tmp_modify2.py``).
+- ``include_end`` (default true): whether ``end`` is part of the span, as in
+  ``replace_block``.
+- ``after``: anchor marker; ``start`` is searched after its first occurrence
+  (the ``base`` trick used for blocks G and H).
+- ``occurrence`` (default 1): which occurrence of ``start`` to use.
+- ``optional``: a missing marker is not an error; the edit is just not
+  applied. Defaults to false for ``path`` entries and true for ``glob``
+  entries, so a glob fans out over the tree and only touches files where the
+  markers exist. A file none of whose edits match is reported as skipped.
+
+All spans are resolved against the original file content, so edits must not
+overlap. Markers and replacements are written with ``\\n``; they are converted
+to the file's own line-ending convention, and a UTF-8 BOM is preserved.
+
+Usage::
+
+    python -m tools.patch_engine spec.json [--root .] [--jobs N] [--dry-run]
+"""
+
+import argparse
+import bisect
+import json
+import os
+import re
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+
+BOM = b'\xef\xbb\xbf'
+
+
+class PatchError(Exception):
+    pass
+
+
+@dataclass(frozen=True)
+class Edit:
+    start: str
+    replacement: str
+    end: str | None = None
+    include_end: bool = True
+    after: str | None = None
+    occurrence: int = 1
+    label: str = ''
+    optional: bool = False
+
+    @classmethod
+    def from_dict(cls, data, index=0, optional=False):
+        if 'start' not in data or 'replacement' not in data:
+            raise PatchError(f"edit #{index}: 'start' and 'replacement' are required")
+        return cls(
+            start=data['start'],
+            replacement=data['replacement'],
+            end=data.get('end'),
+            include_end=data.get('include_end', True),
+            after=data.get('after'),
+            occurrence=int(data.get('occurrence', 1)),
+            label=data.get('label') or f'edit #{index}',
+            optional=bool(data.get('optional', optional)),
+        )
+
+
+@dataclass
+class FileJob:
+    path: str
+    edits: list
+
+
+@dataclass
+class PatchResult:
+    path: str
+    changed: bool = False
+    applied: list = field(default_factory=list)
+    missing: list = field(default_factory=list)
+    error: str | None = None
+
+    @property
+    def status(self):
+        if self.error:
+            return 'error'
+        if self.missing and not self.applied:
+            return 'skipped'
+        return 'changed' if self.changed else 'unchanged'
+
+
+def detect_newline(text):
+    """Dominant line ending of ``text`` ('\\r\\n' or '\\n')."""
+    crlf = text.count('\r\n')
+    lf = text.count('\n') - crlf
+    return '\r\n' if crlf > lf else '\n'
+
+
+def to_newline(value, newline):
+    value = value.replace('\r\n', '\n')
+    return value if newline == '\n' else value.replace('\n', newline)
+
+
+def find_markers(text, markers):
+    """Return ``{marker: [positions]}`` for all markers in one regex pass.
+
+    The lookahead alternation lets the regex engine stop at every position
+    where *some* marker begins, overlapping hits included; the markers that
+    share the matched first character are then confirmed with ``startswith``.
+    """
+    markers = [m for m in dict.fromkeys(markers) if m]
+    hits = {m: [] for m in markers}
+    if not markers:
+        return hits
+    by_first = {}
+    for m in markers:
+        by_first.setdefault(m[0], []).append(m)
+    alternation = '|'.join(re.escape(m) for m in sorted(markers, key=len, reverse=True))
+    for match in re.finditer(f'(?=(?:{alternation}))', text):
+        pos = match.start()
+        for m in by_first[text[pos]]:
+            if text.startswith(m, pos):
+                hits[m].append(pos)
+    return hits
+
+
+def _first_at_or_after(positions, offset):
+    i = bisect.bisect_left(positions, offset)
+    return positions[i] if i < len(positions) else None
+
+
+def resolve_spans(text, edits, newline):
+    """Map each edit to a ``(begin, end, replacement, label)`` span.
+
+    Returns ``(spans, missing)`` where ``missing`` holds ``(edit, reason)``
+    for the edits whose markers were not found.
+    """
+    converted = []
+    for edit in edits:
+        converted.append((
+            edit,
+            to_newline(edit.start, newline),
+            to_newline(edit.end, newline) if edit.end is not None else None,
+            to_newline(edit.after, newline) if edit.after is not None else None,
+        ))
+    markers = []
+    for _, start, end, after in converted:
+        markers.extend(m for m in (start, end, after) if m)
+    hits = find_markers(text, markers)
+
+    spans, missing = [], []
+    for edit, start, end, after in converted:
+        offset = 0
+        if after is not None:
+            anchor = _first_at_or_after(hits.get(after, []), 0)
+            if anchor is None:
+                missing.append((edit, 'after marker not found'))
+                continue
+            offset = anchor
+        positions = hits.get(start, [])
+        i = bisect.bisect_left(positions, offset) + edit.occurrence - 1
+        if i >= len(positions):
+            missing.append((edit, 'start marker not found'))
+            continue
+        begin = positions[i]
+        if end is None:
+            stop = begin + len(start)
+        else:
+            found = _first_at_or_after(hits.get(end, []), begin)
+            if found is None:
+                missing.append((edit, 'end marker not found'))
+                continue
+            stop = found + len(end) if edit.include_end else found
+        spans.append((begin, stop, to_newline(edit.replacement, newline), edit.label))
+
+    spans.sort(key=lambda s: (s[0], s[1]))
+    for prev, cur in zip(spans, spans[1:]):
+        if cur[0] < prev[1]:
+            raise PatchError(f'{prev[3]} overlaps {cur[3]}')
+    return spans, missing
+
+
+def apply_spans(text, spans):
+    parts, last = [], 0
+    for begin, stop, replacement, _ in spans:
+        parts.append(text[last:begin])
+        parts.append(replacement)
+        last = stop
+    parts.append(text[last:])
+    return ''.join(parts)
+
+
+def patch_text(text, edits, result=None):
+    """Apply ``edits`` to ``text``; raises ``PatchError`` if a required one is missing.
+
+    With a ``PatchResult``, the applied labels and skipped optional edits are
+    recorded on it.
+    """
+    spans, missing = resolve_spans(text, edits, detect_newline(text))
+    errors = [_describe(e, reason) for e, reason in missing if not e.optional]
+    if errors:
+        raise PatchError('; '.join(errors))
+    if result is not None:
+        result.missing = [_describe(e, reason) for e, reason in missing]
+        result.applied = [s[3] for s in spans]
+    return apply_spans(text, spans)
+
+
+def _describe(edit, reason):
+    return f'{edit.label}: {reason}'
+
+
+def write_atomic(path, data):
+    tmp = path.with_name(path.name + '.tmp')
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+
+def patch_file(job, dry_run=False):
+    result = PatchResult(job.path)
+    path = Path(job.path)
+    try:
+        raw = path.read_bytes()
+        bom = raw.startswith(BOM)
+        text = raw[len(BOM) if bom else 0:].decode('utf-8', 'surrogateescape')
+        new_text = patch_text(text, job.edits, result)
+        result.changed = new_text != text
+        if result.changed and not dry_run:
+            data = new_text.encode('utf-8', 'surrogateescape')
+            write_atomic(path, BOM + data if bom else data)
+    except (OSError, PatchError) as exc:
+        result.error = str(exc)
+    return result
+
+
+def load_jobs(spec, root='.'):
+    """Expand a spec (list of ``path``/``glob`` entries) into ``FileJob``s.
+
+    Several entries touching the same file are merged so it is still read
+    and written once.
+    """
+    root = Path(root)
+    jobs = {}
+    for n, entry in enumerate(spec):
+        if 'path' in entry:
+            targets, optional = [root / entry['path']], False
+        elif 'glob' in entry:
+            targets, optional = sorted(root.glob(entry['glob'])), True
+        else:
+            raise PatchError(f"entry #{n}: 'path' or 'glob' is required")
+        edits = [
+            Edit.from_dict(e, f'{n}.{i}', optional)
+            for i, e in enumerate(entry.get('edits', []))
+        ]
+        for target in targets:
+            key = str(target)
+            jobs.setdefault(key, FileJob(key, [])).edits.extend(edits)
+    return list(jobs.values())
+
+
+def run(jobs, workers=None, dry_run=False):
+    """Patch every job, fanning out over a process pool when worthwhile."""
+    if workers == 1 or len(jobs) < 4:
+        return [patch_file(job, dry_run) for job in jobs]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        chunk = max(1, len(jobs) // ((workers or os.cpu_count() or 1) * 4))
+        return list(pool.map(patch_file, jobs, [dry_run] * len(jobs), chunksize=chunk))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Apply a declarative marker patch spec.')
+    parser.add_argument('spec', help='JSON spec file')
+    parser.add_argument('--root', default='.', help='base directory for paths/globs')
+    parser.add_argument('--jobs', type=int, default=None, help='worker processes')
+    parser.add_argument('--dry-run', action='store_true', help='report without writing')
+    args = parser.parse_args(argv)
+
+    spec = json.loads(Path(args.spec).read_text(encoding='utf-8-sig'))
+    if isinstance(spec, dict):
+        spec = [spec]
+    results = run(load_jobs(spec, args.root), args.jobs, args.dry_run)
+    failed = False
+    for r in results:
+        if r.status == 'unchanged':
+            continue
+        detail = r.error or ', '.join(r.applied) or '; '.join(r.missing)
+        print(f'{r.status:9} {r.path}: {detail}')
+        failed = failed or r.error is not None
+    counts = {}
+    for r in results:
+        counts[r.status] = counts.get(r.status, 0) + 1
+    print(' '.join(f'{k}={v}' for k, v in sorted(counts.items())) or 'no files')
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,421 @@
+"""Content-addressed cache for AI extraction and analysis results.
+
+Extracting the same file again with the same prompt and model repeats the
+whole upload -> vector store -> assistant -> thread -> run cycle. This cache
+keys each result by a SHA-256 over everything that determines it:
+
+    kind | sha256(file bytes) | prompt | system prompt | provider | model | extra
+
+so any change to the file or prompt produces a different key and misses on
+its own. Nothing needs invalidating. File digests are memoized by
+``(path, size, mtime_ns, inode)``, so a repeated request does not rehash
+the file.
+
+Layout under ``root``::
+
+    objects/ab/abcd...json   result payload (written atomically)
+    index.sqlite             key -> size, created/last access, cost; counters
+
+Eviction is by age and then least-recently-used until the cache fits
+``max_bytes``. Counters (hits, misses, bytes saved, provider seconds and
+tokens saved) live in the index, so they are shared by every process using
+the same root.
+
+Two integrations:
+
+- ``tools.extract_worker`` (``--cache DIR``) looks the file up before the
+  upload stage and stores the assistant text after ``collect``;
+- ``serve`` is a proxy for ``ai_analyze_hybrid_optimized.php`` that accepts
+  the same POST body. The key covers prompt, systemPrompt, provider, model,
+  the context flags and the caller (the token's ``sub`` / ``email``),
+  because the context comes from that user's knowledge base; a new token of
+  the same user keeps hitting. ``--max-age`` bounds how stale that context
+  can get. ``--jwt-secret`` (``JWT_SECRET``) is required, as in
+  ``require_user()``: only a token with a valid HS256 signature that is not
+  expired is looked up; anything else goes to PHP, which answers the 401.
+
+Usage::
+
+    export JWT_SECRET=...   # el de api/config.php (obligatorio para serve)
+    python -m tools.result_cache serve --upstream https://host/catai/api/ai_analyze_hybrid_optimized.php
+    python -m tools.result_cache stats
+    python -m tools.result_cache evict --max-mb 256 --max-age 30d
+"""
+
+import argparse
+import base64
+import hashlib
+import hmac
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from tools.bar_cache import parse_age
+
+KEY_VERSION = b'catai-result-cache/v1'
+DEFAULT_ROOT = Path(__file__).resolve().parent.parent / 'data' / 'result_cache'
+# Cuerpo de ai_analyze_hybrid_optimized.php que cambia la respuesta (con sus valores por defecto).
+ANALYZE_FIELDS = (
+    ('prompt', ''), ('systemPrompt', ''), ('provider', 'auto'), ('model', ''),
+    ('useKnowledgeBase', True), ('includeBehavioralPatterns', False),
+    ('includeAnalysisHistory', False), ('includeFiles', True),
+)
+
+
+def _frame(*parts):
+    digest = hashlib.sha256(KEY_VERSION)
+    for part in parts:
+        data = part if isinstance(part, bytes) else str(part).encode('utf-8')
+        digest.update(len(data).to_bytes(8, 'little'))
+        digest.update(data)
+    return digest.hexdigest()
+
+
+def _b64url_decode(data):
+    return base64.urlsafe_b64decode(data + '=' * (-len(data) % 4))
+
+
+def jwt_claims(auth, secret=None, now=None):
+    """Payload of the ``Authorization: Bearer`` JWT, or ``None`` if PHP would reject it.
+
+    Port of ``jwt_verify_hs256()`` + ``require_user()`` (``api/helpers.php``):
+    the signature is only checked when ``secret`` is given, ``exp`` always.
+    """
+    match = re.match(r'Bearer\s+(.+)', auth or '', re.I)
+    if not match:
+        return None
+    parts = match.group(1).strip().split('.')
+    if len(parts) != 3:
+        return None
+    try:
+        header = json.loads(_b64url_decode(parts[0]))
+        payload = json.loads(_b64url_decode(parts[1]))
+        signature = _b64url_decode(parts[2])
+    except ValueError:  # binascii.Error y UnicodeDecodeError también son ValueError
+        return None
+    if not isinstance(header, dict) or not isinstance(payload, dict) or header.get('alg') != 'HS256':
+        return None
+    if secret is not None:
+        expected = hmac.new(secret.encode('utf-8'), f'{parts[0]}.{parts[1]}'.encode('ascii'), hashlib.sha256).digest()
+        if not hmac.compare_digest(expected, signature):
+            return None
+    try:
+        if 'exp' in payload and (time.time() if now is None else now) >= int(payload['exp']):
+            return None
+    except (TypeError, ValueError):
+        return None
+    if 'email' not in payload and 'sub' not in payload:
+        return None
+    return payload
+
+
+class ResultCache:
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS entries (
+        key TEXT PRIMARY KEY,
+        kind TEXT NOT NULL,
+        size INTEGER NOT NULL,
+        created REAL NOT NULL,
+        last_access REAL NOT NULL,
+        hits INTEGER NOT NULL DEFAULT 0,
+        cost TEXT NOT NULL DEFAULT '{}'
+    );
+    CREATE INDEX IF NOT EXISTS idx_entries_access ON entries(last_access);
+    CREATE TABLE IF NOT EXISTS digests (
+        path TEXT PRIMARY KEY,
+        stamp TEXT NOT NULL,
+        sha256 TEXT NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS counters (
+        name TEXT PRIMARY KEY,
+        value REAL NOT NULL
+    );
+    """
+    COUNTERS = ('hits', 'misses', 'stores', 'evictions', 'bytes_saved', 'seconds_saved', 'tokens_saved')
+
+    def __init__(self, root=DEFAULT_ROOT, max_bytes=None, max_age=None, clock=time.time):
+        self.root = Path(root)
+        self.objects = self.root / 'objects'
+        self.objects.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.clock = clock
+        self._lock = threading.Lock()
+        self.db = sqlite3.connect(str(self.root / 'index.sqlite'), isolation_level=None, timeout=30,
+                                  check_same_thread=False)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.executescript(self.SCHEMA)
+
+    # ----------------------------------------------------------------- keys
+
+    def file_digest(self, path):
+        """SHA-256 of the file contents, memoized by size/mtime/inode."""
+        st = os.stat(path)
+        real = os.path.realpath(path)
+        stamp = f'{st.st_size}:{st.st_mtime_ns}:{st.st_ino}'
+        with self._lock:
+            row = self.db.execute('SELECT stamp, sha256 FROM digests WHERE path = ?', (real,)).fetchone()
+        if row and row[0] == stamp:
+            return row[1]
+        digest = hashlib.sha256()
+        with open(path, 'rb') as handle:
+            for chunk in iter(lambda: handle.read(1 << 20), b''):
+                digest.update(chunk)
+        value = digest.hexdigest()
+        with self._lock:
+            self.db.execute('INSERT OR REPLACE INTO digests VALUES (?, ?, ?)', (real, stamp, value))
+        return value
+
+    def key_for(self, kind, prompt='', model='', provider='', system_prompt='', file_path=None,
+                data=None, extra=None):
+        if file_path is not None:
+            content = self.file_digest(file_path)
+        elif data is not None:
+            content = hashlib.sha256(data).hexdigest()
+        else:
+            content = ''
+        extra = json.dumps(extra or {}, sort_keys=True, ensure_ascii=False, default=str)
+        return _frame(kind, content, prompt, system_prompt, provider, model, extra)
+
+    def analyze_key(self, body, auth='', claims=None):
+        """Key for an ``ai_analyze_hybrid_optimized.php`` request body.
+
+        The caller is the ``sub`` / ``email`` of ``claims`` (from ``jwt_claims``),
+        so a re-issued token of the same user shares entries; without claims
+        the raw ``auth`` header is used.
+        """
+        fields = {name: body.get(name, default) for name, default in ANALYZE_FIELDS}
+        flags = {k: bool(v) for k, v in fields.items() if isinstance(dict(ANALYZE_FIELDS)[k], bool)}
+        if claims is not None:
+            user = {'sub': claims.get('sub'), 'email': claims.get('email')}
+        else:
+            user = {'auth': hashlib.sha256(auth.encode('utf-8')).hexdigest()}
+        return self.key_for('analyze', fields['prompt'], fields['model'], fields['provider'],
+                            fields['systemPrompt'], extra={'flags': flags, 'user': user})
+
+    # --------------------------------------------------------------- access
+
+    def _path(self, key):
+        return self.objects / key[:2] / f'{key}.json'
+
+    def _bump(self, **values):
+        for name, value in values.items():
+            self.db.execute('INSERT INTO counters VALUES (?, ?) ON CONFLICT(name) DO UPDATE SET value = value + ?',
+                            (name, value, value))
+
+    def get(self, key):
+        """Cached value or ``None``; counts the hit or miss."""
+        now = self.clock()
+        with self._lock:
+            row = self.db.execute('SELECT size, created, cost FROM entries WHERE key = ?', (key,)).fetchone()
+            if row and self.max_age and now - row[1] > self.max_age:
+                row = None
+            payload = None
+            if row:
+                try:
+                    payload = self._path(key).read_bytes()
+                except OSError:
+                    self.db.execute('DELETE FROM entries WHERE key = ?', (key,))
+            if payload is None:
+                self._bump(misses=1)
+                return None
+            cost = json.loads(row[2])
+            self.db.execute('UPDATE entries SET last_access = ?, hits = hits + 1 WHERE key = ?', (now, key))
+            self._bump(hits=1, bytes_saved=row[0] + cost.get('upload_bytes', 0),
+                       seconds_saved=cost.get('seconds', 0), tokens_saved=cost.get('tokens', 0))
+        return json.loads(payload)['value']
+
+    def put(self, key, value, kind='', cost=None):
+        """Store ``value`` (JSON-serializable). ``cost`` may carry seconds/tokens/upload_bytes."""
+        payload = json.dumps({'key': key, 'kind': kind, 'value': value}, ensure_ascii=False).encode('utf-8')
+        path = self._path(key)
+        path.parent.mkdir(exist_ok=True)
+        tmp = path.with_suffix(f'.{os.getpid()}.{threading.get_ident()}.tmp')
+        tmp.write_bytes(payload)
+        os.replace(tmp, path)
+        now = self.clock()
+        with self._lock:
+            self.db.execute('INSERT OR REPLACE INTO entries (key, kind, size, created, last_access, cost)'
+                            ' VALUES (?, ?, ?, ?, ?, ?)', (key, kind, len(payload), now, now, json.dumps(cost or {})))
+            self._bump(stores=1)
+        if self.max_bytes:
+            self.evict(self.max_bytes, self.max_age)
+
+    def get_or_compute(self, key, compute, kind=''):
+        """Return ``(value, hit)``; on a miss ``compute()`` gives ``(value, cost)``."""
+        value = self.get(key)
+        if value is not None:
+            return value, True
+        started = time.monotonic()
+        value, cost = compute()
+        cost = {'seconds': round(time.monotonic() - started, 3), **(cost or {})}
+        self.put(key, value, kind, cost)
+        return value, False
+
+    # ------------------------------------------------------------- upkeep
+
+    def evict(self, max_bytes=None, max_age=None):
+        """Drop entries older than ``max_age``, then LRU until under ``max_bytes``."""
+        removed = []
+        with self._lock:
+            if max_age:
+                removed += [r[0] for r in self.db.execute(
+                    'SELECT key FROM entries WHERE created < ?', (self.clock() - max_age,))]
+            if max_bytes is not None:
+                total = self.db.execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+                total -= sum(r[0] for r in self.db.execute(
+                    f"SELECT size FROM entries WHERE key IN ({','.join('?' * len(removed))})", removed))
+                if total > max_bytes:
+                    skip = set(removed)
+                    for key, size in self.db.execute('SELECT key, size FROM entries ORDER BY last_access'):
+                        if total <= max_bytes:
+                            break
+                        if key not in skip:
+                            removed.append(key)
+                            total -= size
+            for key in removed:
+                self.db.execute('DELETE FROM entries WHERE key = ?', (key,))
+                try:
+                    self._path(key).unlink()
+                except FileNotFoundError:
+                    pass
+            if removed:
+                self._bump(evictions=len(removed))
+        return removed
+
+    def stats(self):
+        with self._lock:
+            counters = dict.fromkeys(self.COUNTERS, 0)
+            counters.update(self.db.execute('SELECT name, value FROM counters').fetchall())
+            entries, size = self.db.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries').fetchone()
+            kinds = dict(self.db.execute('SELECT kind, COUNT(*) FROM entries GROUP BY kind').fetchall())
+        lookups = counters['hits'] + counters['misses']
+        return {
+            'entries': entries, 'bytes': size, 'by_kind': kinds,
+            **{k: (int(v) if k != 'seconds_saved' else round(v, 1)) for k, v in counters.items()},
+            'hit_rate': round(counters['hits'] / lookups, 3) if lookups else None,
+        }
+
+
+def make_proxy(cache, upstream, port=8768, host='127.0.0.1', timeout=60, jwt_secret=None):
+    """HTTP front for ``ai_analyze_hybrid_optimized.php`` that answers repeats from the cache.
+
+    ``jwt_secret`` is required: entries are keyed on the token's identity, so
+    an unsigned token must never be able to claim another user's results.
+    """
+    if not jwt_secret:
+        raise ValueError('make_proxy() needs jwt_secret (JWT_SECRET of api/config.php)')
+
+    class Handler(BaseHTTPRequestHandler):
+        def _send(self, status, body, cache_state=None):
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            if cache_state:
+                self.send_header('X-Cache', cache_state)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path.rstrip('/') == '/stats':
+                self._send(200, json.dumps(cache.stats()).encode('utf-8'))
+            else:
+                self.send_error(404)
+
+        def do_POST(self):
+            raw = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+            auth = self.headers.get('Authorization', '')
+            try:
+                body = json.loads(raw or b'{}')
+            except ValueError:
+                body = None
+            if not isinstance(body, dict) or not body.get('prompt'):
+                self._forward(raw, auth, None)  # que PHP conteste el error como siempre
+                return
+            claims = jwt_claims(auth, jwt_secret, cache.clock())
+            if claims is None:
+                self._forward(raw, auth, None)  # token caducado o inválido: nunca se sirve un HIT
+                return
+            key = cache.analyze_key(body, auth, claims)
+            value = cache.get(key)
+            if value is not None:
+                self._send(200, json.dumps(value, ensure_ascii=False).encode('utf-8'), 'HIT')
+                return
+            self._forward(raw, auth, key)
+
+        def _forward(self, raw, auth, key):
+            req = urllib.request.Request(upstream, data=raw, method='POST',
+                                         headers={'Content-Type': 'application/json', 'Authorization': auth})
+            started = time.monotonic()
+            try:
+                with urllib.request.urlopen(req, timeout=timeout) as resp:
+                    status, payload = resp.status, resp.read()
+            except urllib.error.HTTPError as exc:
+                status, payload = exc.code, exc.read()
+            except OSError as exc:
+                self._send(502, json.dumps({'ok': False, 'error': f'upstream: {exc}'}).encode('utf-8'))
+                return
+            if key and status == 200:
+                try:
+                    value = json.loads(payload)
+                except ValueError:
+                    value = None
+                if isinstance(value, dict) and value.get('text'):
+                    cache.put(key, value, 'analyze', {'seconds': round(time.monotonic() - started, 3)})
+            self._send(status, payload, 'MISS' if key else None)
+
+        def log_message(self, *args):
+            pass
+
+    return ThreadingHTTPServer((host, port), Handler)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Content-addressed cache for AI results.')
+    parser.add_argument('--root', default=str(DEFAULT_ROOT))
+    sub = parser.add_subparsers(dest='command', required=True)
+    p_serve = sub.add_parser('serve')
+    p_serve.add_argument('--upstream', required=True, help='URL of ai_analyze_hybrid_optimized.php')
+    p_serve.add_argument('--port', type=int, default=8768)
+    p_serve.add_argument('--max-mb', type=float, default=256)
+    p_serve.add_argument('--max-age', default='1d', help='e.g. 6h, 1d (analysis context staleness)')
+    p_serve.add_argument('--jwt-secret', default=os.environ.get('JWT_SECRET'),
+                         help='JWT_SECRET of api/config.php (required); tokens are verified before a lookup')
+    sub.add_parser('stats')
+    p_evict = sub.add_parser('evict')
+    p_evict.add_argument('--max-mb', type=float)
+    p_evict.add_argument('--max-age')
+    args = parser.parse_args(argv)
+
+    if args.command == 'stats':
+        print(json.dumps(ResultCache(args.root).stats(), indent=2))
+        return 0
+    if args.command == 'evict':
+        cache = ResultCache(args.root)
+        removed = cache.evict(int(args.max_mb * 1024 * 1024) if args.max_mb is not None else None,
+                              parse_age(args.max_age) if args.max_age else None)
+        print(f'{len(removed)} entradas eliminadas')
+        return 0
+
+    if not args.jwt_secret:
+        parser.error('serve necesita --jwt-secret o JWT_SECRET (como require_user())')
+    cache = ResultCache(args.root, int(args.max_mb * 1024 * 1024), parse_age(args.max_age))
+    server = make_proxy(cache, args.upstream, args.port, jwt_secret=args.jwt_secret)
+    print(f'result cache on http://127.0.0.1:{args.port}/ -> {args.upstream}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.shutdown()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
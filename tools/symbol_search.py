@@ -0,0 +1,393 @@
+"""Resident symbol search over ``data/universe.json`` (replacement for ``search_local``).
+
+``search_local()`` in ``api/search.php`` decodes the whole universe file and
+scans every entry on each keystroke. This service loads the universe once
+and keeps three indexes:
+
+- a symbol prefix trie whose nodes store their best matches precomputed, so
+  a prefix lookup costs ``len(q)`` dict hops;
+- an n-gram (1..3) index over names: only the shortest posting list of the
+  query's n-grams is scanned, verified with ``in`` and cut at the limit;
+- a symmetric-delete index over symbols and name words for typo tolerance
+  (edit distance 1, 2 for long terms, transpositions included).
+
+Ranking: exact ticker, ticker prefix, name substring, fuzzy. Matching is
+case- and accent-insensitive (``mb_strtoupper`` plus accent folding). The
+file is watched and the indexes are rebuilt in the background when it
+changes, while the previous ones keep serving.
+
+Usage::
+
+    python -m tools.symbol_search query app
+    python -m tools.symbol_search serve --port 8767        # GET /search?q=app
+    python -m tools.symbol_search bench --sizes 300 3000 30000 100000
+"""
+
+import argparse
+import json
+import random
+import statistics
+import string
+import sys
+import threading
+import time
+import unicodedata
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+LIMIT = 30  # igual que search_local()
+DEFAULT_UNIVERSE = Path(__file__).resolve().parent.parent / 'data' / 'universe.json'
+
+
+def fold(text):
+    """Uppercase without accents: 'Teléfonica' -> 'TELEFONICA'."""
+    decomposed = unicodedata.normalize('NFKD', str(text or ''))
+    return ''.join(ch for ch in decomposed if not unicodedata.combining(ch)).upper()
+
+
+def _deletes(term, distance):
+    results = {term}
+    frontier = {term}
+    for _ in range(distance):
+        frontier = {w[:i] + w[i + 1:] for w in frontier for i in range(len(w))}
+        results |= frontier
+    return results
+
+
+def edit_distance(a, b, cap=2):
+    """Optimal string alignment distance (Damerau), stops early above ``cap``."""
+    if abs(len(a) - len(b)) > cap:
+        return cap + 1
+    prev2, prev = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        cur = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                cur[j] = min(cur[j], prev2[j - 2] + 1)
+        if min(cur) > cap:
+            return cap + 1
+        prev2, prev = prev, cur
+    return prev[-1]
+
+
+def _max_typos(term):
+    return 0 if len(term) < 4 else 1 if len(term) < 8 else 2
+
+
+class SymbolIndex:
+    """Immutable indexes over one universe snapshot."""
+
+    def __init__(self, entries, limit=LIMIT):
+        self.limit = limit
+        self.entries = []
+        for entry in entries:
+            if isinstance(entry, dict) and entry.get('symbol'):
+                self.entries.append({'symbol': entry['symbol'], 'name': entry.get('name', '')})
+        self.symbols = [fold(e['symbol']) for e in self.entries]
+        self.names = [fold(e['name']) for e in self.entries]
+
+        self.exact = {}
+        for i, sym in enumerate(self.symbols):
+            self.exact.setdefault(sym, i)
+
+        # Trie de prefijos: cada nodo guarda sus mejores ids (símbolo más corto primero).
+        self.trie = {}
+        for i in sorted(range(len(self.symbols)), key=lambda i: (len(self.symbols[i]), self.symbols[i], i)):
+            node = self.trie
+            for ch in self.symbols[i]:
+                node = node.setdefault(ch, {'': []})
+                if len(node['']) < limit:
+                    node[''].append(i)
+
+        self.grams = {}
+        for i, name in enumerate(self.names):
+            seen = set()
+            for n in (1, 2, 3):
+                for pos in range(len(name) - n + 1):
+                    seen.add(name[pos:pos + n])
+            for gram in seen:
+                self.grams.setdefault(gram, []).append(i)
+
+        self.typo_index = {}
+        self.terms = {}
+        for i, (sym, name) in enumerate(zip(self.symbols, self.names)):
+            for term in {sym, *(w for w in name.replace(',', ' ').replace('.', ' ').split() if len(w) >= 3)}:
+                self.terms.setdefault(term, []).append(i)
+        for term in self.terms:
+            for variant in _deletes(term, _max_typos(term)):
+                self.typo_index.setdefault(variant, []).append(term)
+
+    def _prefix(self, q):
+        node = self.trie
+        for ch in q:
+            node = node.get(ch)
+            if node is None:
+                return []
+        return node['']
+
+    def _substring(self, q, skip, room):
+        # Orden del universo, como search_local(): se corta en cuanto hay ``room`` aciertos.
+        n = min(len(q), 3)
+        base = None
+        for pos in range(len(q) - n + 1):
+            ids = self.grams.get(q[pos:pos + n])
+            if not ids:
+                return []
+            if base is None or len(ids) < len(base):
+                base = ids
+        names, hits = self.names, []
+        for i in base:
+            if q in names[i] and i not in skip:
+                hits.append(i)
+                if len(hits) >= room:
+                    break
+        return hits
+
+    def _fuzzy(self, q, skip, room):
+        cap = _max_typos(q)
+        if not cap:
+            return []
+        matched = {}
+        for variant in _deletes(q, cap):
+            for term in self.typo_index.get(variant, ()):
+                if term not in matched:
+                    matched[term] = edit_distance(q, term, cap)
+        hits, seen = [], set(skip)
+        for term, dist in sorted(matched.items(), key=lambda kv: (kv[1], kv[0])):
+            if dist > cap:
+                break
+            for i in self.terms[term]:
+                if i not in seen:
+                    seen.add(i)
+                    hits.append(i)
+                    if len(hits) >= room:
+                        return hits
+        return hits
+
+    def search(self, query, limit=None):
+        limit = min(limit or self.limit, self.limit)
+        q = fold(query).strip()
+        if not q:
+            return []
+        ids = []
+        exact = self.exact.get(q)
+        if exact is not None:
+            ids.append(exact)
+        ids.extend(i for i in self._prefix(q) if i != exact)
+        ids = ids[:limit]
+        if len(ids) < limit:
+            ids.extend(self._substring(q, set(ids), limit - len(ids)))
+        if len(ids) < limit:
+            ids.extend(self._fuzzy(q, set(ids), limit - len(ids)))
+        return [dict(self.entries[i]) for i in ids]
+
+
+def linear_search(entries, q, limit=LIMIT):
+    """Port of ``search_local()`` used as the benchmark baseline."""
+    q_upper = q.upper()
+    out = []
+    for x in entries:
+        if x['symbol'].upper().startswith(q_upper) or q_upper in x['name'].upper():
+            out.append({'symbol': x['symbol'], 'name': x['name']})
+            if len(out) >= limit:
+                break
+    return out
+
+
+class SymbolSearchService:
+    """Universe file + index, rebuilt in the background when the file changes."""
+
+    def __init__(self, path=DEFAULT_UNIVERSE, check_interval=1.0):
+        self.path = Path(path)
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._rebuilding = False
+        self._checked = 0.0
+        self._stamp = None
+        self.index = self._build() or SymbolIndex([])
+
+    def _stat(self):
+        try:
+            st = self.path.stat()
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def _build(self):
+        """Fresh index, or None if the file is missing or half-written.
+
+        On failure ``_stamp`` is left alone, so the next check retries and the
+        current index keeps serving meanwhile.
+        """
+        stamp = self._stat()
+        try:
+            data = json.loads(self.path.read_text(encoding='utf-8-sig'))
+        except (OSError, ValueError):
+            return None
+        if not isinstance(data, list):
+            return None
+        self._stamp = stamp
+        return SymbolIndex(data)
+
+    def _rebuild(self):
+        try:
+            index = self._build()
+            if index is not None:
+                self.index = index
+        finally:
+            with self._lock:
+                self._rebuilding = False
+
+    def _maybe_reload(self):
+        now = time.monotonic()
+        if now - self._checked < self.check_interval:
+            return
+        self._checked = now
+        if self._stat() == self._stamp:
+            return
+        with self._lock:
+            if self._rebuilding:
+                return
+            self._rebuilding = True
+        threading.Thread(target=self._rebuild, daemon=True).start()
+
+    def search(self, q, limit=None):
+        self._maybe_reload()
+        return self.index.search(q, limit)
+
+
+def make_server(service, port=8767, host='127.0.0.1'):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urllib.parse.urlparse(self.path)
+            if url.path != '/search':
+                self.send_error(404)
+                return
+            query = dict(urllib.parse.parse_qsl(url.query))
+            limit = int(query['limit']) if query.get('limit', '').isdigit() else None
+            body = json.dumps(service.search(query.get('q', ''), limit), ensure_ascii=False).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    return ThreadingHTTPServer((host, port), Handler)
+
+
+# --------------------------------------------------------------------- bench
+
+_WORDS = ('Global Energy Capital Holdings Systems Technologies Pharmaceuticals Financial '
+          'Industries Resources Networks Semiconductor Biotech Airlines Motors Retail Foods '
+          'Realty Trust Partners Solutions Communications Therapeutics Minerals Software '
+          'Insurance Logistics Media Gaming Health Bancorp Utilities').split()
+
+
+def synthetic_universe(size, seed=1):
+    rng = random.Random(seed)
+    seen, entries = set(), []
+    while len(entries) < size:
+        sym = ''.join(rng.choice(string.ascii_uppercase) for _ in range(rng.choice((1, 2, 3, 4, 4, 5))))
+        if sym in seen:
+            continue
+        seen.add(sym)
+        name = ' '.join(rng.sample(_WORDS, rng.choice((2, 3)))) + rng.choice((' Inc.', ' Corp.', ' plc', ' Ltd.'))
+        entries.append({'symbol': sym, 'name': name})
+    return entries
+
+
+def _queries(entries, rng, count):
+    queries = []
+    for _ in range(count):
+        entry = rng.choice(entries)
+        kind = rng.random()
+        if kind < 0.4:
+            queries.append(entry['symbol'][:rng.randint(1, len(entry['symbol']))])
+        elif kind < 0.7:
+            word = rng.choice(entry['name'].split())
+            queries.append(word[:rng.randint(3, max(3, len(word)))])
+        else:
+            word = rng.choice(entry['name'].split())
+            if len(word) > 4:
+                i = rng.randrange(len(word) - 1)
+                word = word[:i] + word[i + 1] + word[i] + word[i + 2:]  # transposición
+            queries.append(word)
+    return queries
+
+
+def _percentiles(samples):
+    ordered = sorted(samples)
+    pick = lambda p: ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+    return statistics.median(ordered), pick(0.99)
+
+
+def bench(sizes, queries=2000, seed=3):
+    rows = []
+    for size in sizes:
+        entries = synthetic_universe(size, seed)
+        rng = random.Random(seed)
+        qs = _queries(entries, rng, queries)
+        started = time.perf_counter()
+        index = SymbolIndex(entries)
+        build = time.perf_counter() - started
+
+        samples = []
+        for q in qs:
+            t0 = time.perf_counter()
+            index.search(q)
+            samples.append((time.perf_counter() - t0) * 1000)
+        baseline = []
+        for q in qs[:200]:
+            t0 = time.perf_counter()
+            linear_search(entries, q)
+            baseline.append((time.perf_counter() - t0) * 1000)
+        p50, p99 = _percentiles(samples)
+        b50, b99 = _percentiles(baseline)
+        rows.append({'size': size, 'build_s': round(build, 3), 'p50_ms': round(p50, 4), 'p99_ms': round(p99, 4),
+                     'linear_p50_ms': round(b50, 4), 'linear_p99_ms': round(b99, 4)})
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Resident symbol search for data/universe.json.')
+    parser.add_argument('--universe', default=str(DEFAULT_UNIVERSE))
+    sub = parser.add_subparsers(dest='command', required=True)
+    p_query = sub.add_parser('query')
+    p_query.add_argument('q')
+    p_query.add_argument('--limit', type=int)
+    p_serve = sub.add_parser('serve')
+    p_serve.add_argument('--port', type=int, default=8767)
+    p_bench = sub.add_parser('bench')
+    p_bench.add_argument('--sizes', type=int, nargs='+', default=[300, 3000, 30000, 100000])
+    p_bench.add_argument('--queries', type=int, default=2000)
+    args = parser.parse_args(argv)
+
+    if args.command == 'bench':
+        rows = bench(args.sizes, args.queries)
+        header = list(rows[0])
+        print('  '.join(f'{h:>13}' for h in header))
+        for row in rows:
+            print('  '.join(f'{row[h]:>13}' for h in header))
+        return 0
+
+    service = SymbolSearchService(args.universe)
+    if args.command == 'query':
+        print(json.dumps(service.search(args.q, args.limit), ensure_ascii=False, indent=2))
+        return 0
+    server = make_server(service, args.port)
+    print(f'symbol search on http://127.0.0.1:{args.port}/search?q=')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.shutdown()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,39 @@
+from tools.apply_patch import apply_patches, apply_update, parse_patch
+
+
+def _update(raw, body):
+    ops = parse_patch(f'*** Begin Patch\n*** Update File: f.txt\n{body}*** End Patch\n')
+    return apply_update(raw, ops[0].hunks)
+
+
+def test_context_keeps_file_whitespace_on_fuzzy_match():
+    raw = b'\tif (a) {  \n\t\tx = 1;\n\t}  \n'
+    data, reports = _update(raw, '@@\n   if (a) {\n-   x = 1;\n+   x = 2;\n   }\n')
+    assert reports[0].level != 'exact'
+    assert data == b'\tif (a) {  \n   x = 2;\n\t}  \n'
+
+
+def test_append_to_file_without_trailing_newline():
+    data, _ = _update(b'a\nb', '@@\n b\n+c\n')
+    assert data == b'a\nb\nc'
+
+
+def test_crlf_and_bom_preserved():
+    raw = b'\xef\xbb\xbfuno\r\ndos\r\ntres\r\n'
+    data, _ = _update(raw, '@@\n uno\n-dos\n+DOS\n tres\n')
+    assert data == b'\xef\xbb\xbfuno\r\nDOS\r\ntres\r\n'
+
+
+def test_move_onto_existing_file_is_rejected(tmp_path):
+    (tmp_path / 'a.txt').write_text('uno\n')
+    (tmp_path / 'b.txt').write_text('otro\n')
+    patch = '*** Begin Patch\n*** Update File: a.txt\n*** Move to: b.txt\n@@\n-uno\n+UNO\n*** End Patch\n'
+    reports = apply_patches([patch], tmp_path)
+    assert 'move target already exists' in reports[0].error
+    assert (tmp_path / 'a.txt').read_text() == 'uno\n'
+    assert (tmp_path / 'b.txt').read_text() == 'otro\n'
+
+    (tmp_path / 'b.txt').unlink()
+    reports = apply_patches([patch], tmp_path)
+    assert reports[0].error is None
+    assert not (tmp_path / 'a.txt').exists() and (tmp_path / 'b.txt').read_text() == 'UNO\n'
@@ -0,0 +1,74 @@
+import threading
+import time
+
+import pytest
+
+import tools.bar_cache as bar_cache
+from tools.bar_cache import AlphaVantageFetcher, BarCache
+
+NOW = 1_700_006_400  # múltiplo de 300
+
+
+def test_lagging_provider_leaves_head_as_gap(tmp_path):
+    def fetcher(symbol, reso, start, end):
+        bars = [(t, 1.0) for t in range(start - start % 300, NOW - 3600, 300) if t >= start]
+        return bars, (start, bars[-1][0] + 300) if bars else None
+
+    cache = BarCache(tmp_path, fetcher, clock=lambda: NOW)
+    key = cache.key('spy', '5m')
+    cache.get('SPY', '5m', NOW - 86400)
+    assert cache.missing(key, NOW - 86400, NOW) == [(NOW - 3600, NOW)]
+    assert cache.missing(key, NOW - 86400, NOW - 7200) == []
+
+
+def test_alpha_vantage_compact_falls_back_to_full(monkeypatch):
+    calls = []
+
+    def fake_get(url, timeout, retries):
+        size = 100 if 'outputsize=compact' in url else 300
+        calls.append(size)
+        stamps = {bar_cache._day(NOW - i * 86400): {'4. close': '1.0'} for i in range(size)}
+        return {'Time Series (Daily)': stamps}
+
+    monkeypatch.setattr(bar_cache, '_http_get_json', fake_get)
+    fetcher = AlphaVantageFetcher('k', clock=lambda: NOW)
+    start = NOW - 200 * 86400
+    bars, answered = fetcher('SPY', 'daily', start, NOW)
+    assert calls == [100, 300]
+    assert len(bars) == 201
+    assert answered == (start, NOW)
+
+
+@pytest.fixture
+def chicago(monkeypatch):
+    if not hasattr(time, 'tzset'):
+        pytest.skip('time.tzset() needs POSIX')
+    monkeypatch.setenv('TZ', 'America/Chicago')
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+def test_daily_bars_use_local_time_like_strtotime(monkeypatch, chicago):
+    monkeypatch.setattr(bar_cache, '_http_get_json', lambda url, timeout, retries: [
+        {'date': '2024-01-02T00:00:00.000Z', 'close': 1.0}, {'date': '2024-07-02T00:00:00.000Z', 'close': 2.0},
+    ])
+    bars, _ = bar_cache.TiingoFetcher('k', clock=lambda: NOW)('SPY', 'daily', 0, 2_000_000_000)
+    # strtotime('2024-01-02 16:00:00') con date.timezone=America/Chicago (CST y CDT)
+    assert [t for t, _ in bars] == [1704232800, 1719954000]
+
+
+def test_read_waits_for_an_exclusive_writer(tmp_path):
+    cache = BarCache(tmp_path, lambda *a: ([], None), clock=lambda: NOW)
+    key = cache.key('SPY', '5min')
+    with cache._flock(key, exclusive=True):
+        cache._store(key, [(NOW - 300, 1.0)], [(NOW - 300, NOW)])
+        rows = []
+        reader = threading.Thread(target=lambda: rows.extend(cache.read(key)))
+        reader.start()
+        reader.join(0.2)
+        assert reader.is_alive() and rows == []
+        cache._store(key, [(NOW - 600, 2.0)], [])  # reescribe las columnas (os.replace)
+    reader.join(5)
+    assert rows == [{'t': NOW - 600, 'c': 2.0}, {'t': NOW - 300, 'c': 1.0}]
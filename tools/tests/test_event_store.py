@@ -0,0 +1,52 @@
+import json
+import os
+
+from tools.event_store import EventStore
+
+
+def _write(path, start, count, mode='w'):
+    with open(path, mode, encoding='utf-8') as handle:
+        for i in range(start, start + count):
+            handle.write(json.dumps({'ts': 1700000000 + i, 'uid': 4, 'ev': 'settings_get', 'data': {'n': i}}) + '\n')
+
+
+def _numbers(store):
+    return sorted(event['data']['n'] for event in store.query(uid='4'))
+
+
+def test_ingest_reads_rotated_file_then_new_one(tmp_path):
+    log = tmp_path / 'prefs.log'
+    _write(log, 0, 3)
+    store = EventStore(tmp_path / 'store')
+    assert store.ingest(log) == 3
+    _write(log, 3, 2, mode='a')
+    os.replace(log, tmp_path / 'prefs.log.1')
+    _write(log, 5, 10)  # ya más grande que el offset guardado
+    assert store.ingest(log) == 12
+    assert _numbers(store) == list(range(15))
+    assert store.ingest(log) == 0
+
+
+def test_ingest_detects_replaced_file_that_grew(tmp_path):
+    log = tmp_path / 'prefs.log'
+    _write(log, 0, 2)
+    store = EventStore(tmp_path / 'store')
+    store.ingest(log)
+    _write(tmp_path / 'new.log', 10, 6)
+    os.replace(tmp_path / 'new.log', log)
+    assert store.ingest(log) == 6
+    assert _numbers(store) == [0, 1] + list(range(10, 16))
+
+
+def test_ref_shaped_payloads_round_trip(tmp_path):
+    log = tmp_path / 'prefs.log'
+    big = 'x' * 400
+    events = [
+        {'ts': 1700000000, 'uid': 4, 'ev': 'a', 'data': {'$ref': 'no-es-un-digest'}},
+        {'ts': 1700000001, 'uid': 4, 'ev': 'b', 'data': {'$$ref': big, 'lista': [{'$ref': big}]}},
+        {'ts': 1700000002, 'uid': 4, 'ev': 'c', '$ref': 'arriba'},
+    ]
+    log.write_text(''.join(json.dumps(e) + '\n' for e in events), encoding='utf-8')
+    store = EventStore(tmp_path / 'store')
+    store.ingest(log)
+    assert list(store.query(uid='4')) == events
@@ -0,0 +1,189 @@
+import asyncio
+import base64
+import json
+import threading
+
+import pytest
+
+from tools.extract_worker import (
+    DEFAULT_PROMPT, AdaptivePoller, ExtractWorker, FakeProvider, JobQueue, LeaseLost, OpsProvider, _demo_source,
+    _hkdf_sha256, catai_decrypt, sync_pending,
+)
+from tools.ops_executor import OpsExecutor, load_ops, serve_mock
+
+
+@pytest.fixture
+def mock():
+    server = serve_mock()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    server.base = f'http://127.0.0.1:{server.server_address[1]}'
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_ops_provider_runs_every_stage_against_mock(mock, tmp_path):
+    source = _demo_source(tmp_path, 3)
+    queue = JobQueue(tmp_path / 'jobs.sqlite')
+
+    async def go():
+        executor = OpsExecutor(load_ops(), 'sk-test', base_url=mock.base)
+        worker = ExtractWorker(queue, source, OpsProvider(executor), 2, tmp_path / 'uploads', vs_id='vs_1',
+                               assistant_id='asst_1', poller=AdaptivePoller(base=0.01), owner='test')
+        try:
+            await worker.run(stop_when_idle=True)
+        finally:
+            executor.close()
+
+    asyncio.run(go())
+    rows = source.conn.execute('SELECT extraction_status, last_error FROM knowledge_files').fetchall()
+    assert rows == [('completed', None)] * 3
+    content = source.conn.execute("SELECT content FROM knowledge_base WHERE source_file = 'Doc 1.txt'").fetchone()[0]
+    assert json.loads(content)['resumen'] == 'Archivo: Doc 1.txt (#1)'
+
+
+def test_source_uses_each_users_vector_store_assistant_and_prompt(tmp_path):
+    source = _demo_source(tmp_path, 3)
+    rows = {row['user_id']: row for row in source.pending()}
+    assert rows[1]['user_vs_id'] is None and rows[1]['user_prompt'] is None
+    assert (rows[2]['user_vs_id'], rows[2]['user_assistant_id']) == ('vs_user2', 'asst_user2')
+    assert rows[3]['user_prompt'] == 'Resume el documento en JSON con resumen.'
+
+    source.conn.execute("UPDATE ai_vector_stores SET status = 'error' WHERE owner_user_id = 2")
+    assert source.user_config(2)['user_vs_id'] is None
+
+
+def test_run_uses_per_user_ids_and_falls_back_to_flags(tmp_path):
+    source = _demo_source(tmp_path, 3)
+    calls = []
+
+    class Recorder(FakeProvider):
+        async def attach(self, vs_id, file_id, api_key=None):
+            calls.append(('attach', vs_id))
+
+        async def create_run(self, thread_id, assistant_id, api_key=None):
+            calls.append(('run', assistant_id, self.prompts[thread_id].split('\n')[0]))
+            return await super().create_run(thread_id, assistant_id)
+
+    worker = ExtractWorker(JobQueue(tmp_path / 'jobs.sqlite'), source, Recorder(latency=0, index_seconds=0,
+                           run_seconds=0), 1, tmp_path / 'uploads', vs_id='vs_flag', assistant_id='asst_flag',
+                           poller=AdaptivePoller(base=0.01), owner='test')
+    asyncio.run(worker.run(stop_when_idle=True))
+    assert ('attach', 'vs_flag') in calls and ('attach', 'vs_user2') in calls and ('attach', 'vs_user3') in calls
+    assert ('run', 'asst_user3', 'Resume el documento en JSON con resumen.') in calls
+    assert ('run', 'asst_flag', DEFAULT_PROMPT) in calls
+
+
+def test_each_owner_calls_the_provider_with_their_own_key(mock, tmp_path):
+    source = _demo_source(tmp_path, 6)
+    for user in (2, 3):
+        source.conn.execute("INSERT INTO user_ai_api_keys (user_id, provider_id, api_key_enc, status)"
+                            " VALUES (?, 1, ?, 'active')", (user, f'enc:sk-owner{user}'))
+    source.decrypt = lambda blob: blob[len('enc:'):]
+    queue = JobQueue(tmp_path / 'jobs.sqlite')
+
+    async def go():
+        executor = OpsExecutor(load_ops(), 'sk-test', base_url=mock.base)
+        worker = ExtractWorker(queue, source, OpsProvider(executor), 3, tmp_path / 'uploads', vs_id='vs_1',
+                               assistant_id='asst_1', poller=AdaptivePoller(base=0.01), owner='test')
+        try:
+            await worker.run(stop_when_idle=True)
+        finally:
+            executor.close()
+
+    asyncio.run(go())
+    assert source.conn.execute('SELECT DISTINCT extraction_status FROM knowledge_files').fetchall() == [('completed',)]
+    # Usuario 1 no tiene clave: usa la del executor (--api-key).
+    assert sorted(mock.auth['run.create']) == ['Bearer sk-owner2', 'Bearer sk-owner2', 'Bearer sk-owner3',
+                                               'Bearer sk-owner3', 'Bearer sk-test', 'Bearer sk-test']
+    assert set(mock.auth['file.upload']) == {'Bearer sk-owner2', 'Bearer sk-owner3', 'Bearer sk-test'}
+    assert 'sk-owner' not in ''.join(r[0] for r in queue.db.execute('SELECT payload FROM jobs'))
+
+
+def test_hkdf_matches_php_hash_hkdf():
+    # RFC 5869, caso 1 (hash_hkdf('sha256', $ikm, 42, $info, $salt))
+    okm = _hkdf_sha256(bytes([0x0b] * 22), bytes(range(13)), bytes(range(0xf0, 0xfa)), 42)
+    assert okm.hex() == ('3cb25f25faacd57a90434f64d0362f2a2d2d0a90cf1a5a4c5db02d56ecc4c5bf'
+                         '34007208d5b887185865')
+
+
+def test_catai_decrypt_reads_php_envelopes():
+    bindings = pytest.importorskip('nacl.bindings')
+    kek, salt, nonce = bytes(range(32)), b's' * 16, b'n' * 24
+    key = _hkdf_sha256(kek, salt, b'catai-secrets-v1')
+    ct = bindings.crypto_aead_xchacha20poly1305_ietf_encrypt(b'sk-plain', b'catai|v1|k1', nonce, key)
+    b64 = lambda raw: base64.b64encode(raw).decode()  # noqa: E731
+    blob = json.dumps({'v': 1, 'kid': 'k1', 's': b64(salt), 'n': b64(nonce), 'ct': b64(ct)})
+    assert catai_decrypt(blob, {'active_kid': 'k1', 'keys': {'k1': {'kek_b64': b64(kek), 'status': 'active'}}}) \
+        == 'sk-plain'
+
+
+def test_crash_before_advance_does_not_repeat_upload_thread_or_run(tmp_path):
+    source = _demo_source(tmp_path, 1)
+    provider = FakeProvider(latency=0, index_seconds=0, run_seconds=0)
+    now = [1000.0]
+    queue = JobQueue(tmp_path / 'jobs.sqlite', lease_seconds=60, clock=lambda: now[0])
+    worker = ExtractWorker(queue, source, provider, 1, tmp_path / 'uploads', vs_id='vs_1', assistant_id='asst_1',
+                           poller=AdaptivePoller(base=0.01), owner='a')
+    sync_pending(queue, source)
+    advance = queue.advance
+    for crash_at in ('attach', 'wait'):  # justo después de la subida / de crear el run
+
+        def crashing(job, stage, cp, crash_at=crash_at):
+            if stage == crash_at:
+                raise LeaseLost('caída simulada')
+            advance(job, stage, cp)
+
+        queue.advance = crashing
+        with pytest.raises(LeaseLost):
+            asyncio.run(worker.process(queue.claim('a')))
+        now[0] += 61  # vence el lease del worker caído
+    queue.advance = advance
+    asyncio.run(worker.process(queue.claim('b')))
+    assert queue.depth()['done'] == 1
+    assert provider.uploads == {'doc_1.txt': 1}
+    assert len(provider.prompts) == 1 and sum(provider.runs.values()) == 1
+
+
+def test_reextracted_file_is_queued_again(tmp_path):
+    source = _demo_source(tmp_path, 1)
+    provider = FakeProvider(latency=0, index_seconds=0, run_seconds=0)
+    queue = JobQueue(tmp_path / 'jobs.sqlite')
+
+    def drain():
+        worker = ExtractWorker(queue, source, provider, 1, tmp_path / 'uploads', vs_id='vs_1', assistant_id='asst_1',
+                               poller=AdaptivePoller(base=0.01), owner='test')
+        asyncio.run(worker.run(stop_when_idle=True))
+
+    drain()
+    source.conn.execute("UPDATE knowledge_files SET extraction_status = 'pending'")
+    drain()
+    assert source.conn.execute('SELECT extraction_status FROM knowledge_files').fetchone() == ('completed',)
+    assert sum(provider.runs.values()) == 2
+    assert sum(provider.uploads.values()) == 1  # reutiliza openai_file_id
+    assert queue.depth()['done'] == 1
+
+
+def test_cache_key_follows_sent_prompt_assistant_and_model(tmp_path):
+    from tools.result_cache import ResultCache
+
+    source = _demo_source(tmp_path, 4)
+    uploads = tmp_path / 'uploads' / '2'
+    (uploads / 'doc_4.txt').write_bytes((uploads / 'doc_1.txt').read_bytes())  # mismos bytes, otro nombre
+    provider = FakeProvider(latency=0, index_seconds=0, run_seconds=0)
+    queue = JobQueue(tmp_path / 'jobs.sqlite')
+    cache = ResultCache(tmp_path / 'cache')
+
+    def drain():
+        worker = ExtractWorker(queue, source, provider, 2, tmp_path / 'uploads', vs_id='vs_1', assistant_id='asst_1',
+                               poller=AdaptivePoller(base=0.01), owner='test', cache=cache)
+        asyncio.run(worker.run(stop_when_idle=True))
+        source.conn.execute("UPDATE knowledge_files SET extraction_status = 'pending'")
+
+    drain()
+    assert sum(provider.runs.values()) == 4  # el nombre del archivo va en el prompt: doc_4 no acierta
+    drain()
+    assert sum(provider.runs.values()) == 4
+    source.conn.execute("UPDATE ai_vector_stores SET assistant_model = 'gpt-4o' WHERE owner_user_id = 2")
+    drain()
+    assert sum(provider.runs.values()) == 6
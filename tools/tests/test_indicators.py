@@ -0,0 +1,53 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from tools import indicators  # noqa: E402
+from tools.indicators import PHP_INDICATORS, IndicatorEngine, _reference, to_php_list  # noqa: E402
+
+
+def _walks(lengths, seed=3):
+    rng = np.random.default_rng(seed)
+    return {f'S{i}': [round(float(x), 4) for x in 100 + np.cumsum(rng.normal(0, 1, n))]
+            for i, n in enumerate(lengths)}
+
+
+def _php(series):
+    return {key: {name: _reference(close, name) for name in PHP_INDICATORS} for key, close in series.items()}
+
+
+def _engine_lists(computed):
+    return {key: {name: to_php_list(values[name], values.get(name + ':warm')) for name in PHP_INDICATORS}
+            for key, values in computed.items()}
+
+
+@pytest.mark.parametrize('scalar_max', [0, 1000])  # fuerza la ruta NumPy o la escalar
+def test_full_run_matches_php_ports(monkeypatch, scalar_max):
+    monkeypatch.setattr(indicators, 'SCALAR_MAX_SERIES', scalar_max)
+    series = _walks([1, 2, 13, 14, 15, 19, 20, 21, 250, 400])  # incluye series más cortas que el periodo
+    computed = IndicatorEngine(series.keys(), PHP_INDICATORS).run(series)
+    assert _engine_lists(computed) == _php(series)
+
+
+def test_nulls_match_php_ports():
+    series = _walks([60, 60, 30])
+    series['S0'][0] = None
+    series['S1'][10] = series['S1'][11] = None
+    series['S2'][-1] = None
+    computed = IndicatorEngine(series.keys(), PHP_INDICATORS).run(series)
+    assert _engine_lists(computed) == _php(series)
+
+
+@pytest.mark.parametrize('scalar_max', [0, 1000])
+def test_update_continues_a_run(monkeypatch, scalar_max):
+    monkeypatch.setattr(indicators, 'SCALAR_MAX_SERIES', scalar_max)
+    series = _walks([5, 16, 230, 300])
+    head = {key: close[:len(close) - 40] if len(close) > 40 else close[:2] for key, close in series.items()}
+    engine = IndicatorEngine(series.keys(), PHP_INDICATORS)
+    got = _engine_lists(engine.run(head))
+    for key in series:
+        for close in series[key][len(head[key]):]:
+            row = engine.update({key: close})[key]
+            for name in PHP_INDICATORS:
+                got[key][name].append(row[name])
+    assert got == _php(series)
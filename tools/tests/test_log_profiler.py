@@ -0,0 +1,15 @@
+from pathlib import Path
+
+from tools.log_profiler import profile
+
+FIXTURES = Path(__file__).parent / 'fixtures'
+
+
+def test_ops_from_execute_ops_operation_lines():
+    stats, _ = profile([str(FIXTURES / 'ai_extract_debug_ops.log')])
+    report = stats.report()
+    assert report['runs'] == 1
+    assert report['op']['vs.get'] == {'n': 1, 'p50': 2.0, 'p95': 2.0, 'p99': 2.0}
+    assert report['op']['vs.store.get']['p50'] == 3.0  # cerrado por "HTTP inesperado"
+    assert report['op']['run.create']['p50'] == 1.0
+    assert report['user'] == {'4': {'n': 1, 'p50': 7.0, 'p95': 7.0, 'p99': 7.0}}
@@ -0,0 +1,153 @@
+import asyncio
+import threading
+import time
+from urllib.parse import urlsplit
+
+import pytest
+
+from tools.ops_executor import ConnectionPool, OpsError, OpsExecutor, load_ops, serve_mock
+
+
+@pytest.fixture
+def mock():
+    server = serve_mock(delay=0.02)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    server.base = f'http://127.0.0.1:{server.server_address[1]}'
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _run(mock, scenario):
+    async def go():
+        executor = OpsExecutor(load_ops(), 'sk-test', limits={urlsplit(mock.base).netloc: 4}, base_url=mock.base)
+        try:
+            return await scenario(executor)
+        finally:
+            executor.close()
+
+    return asyncio.run(go())
+
+
+def test_multipart_upload(mock, tmp_path):
+    pdf = tmp_path / 'demo.pdf'
+    pdf.write_bytes(b'%PDF-1.4 demo')
+    upload = _run(mock, lambda ex: ex.call('vs.upload', {'FILE_PATH': str(pdf), 'FILE_NAME': 'demo.pdf'}))
+    assert upload['id'].startswith('file-')
+
+
+def test_attach_calls_are_batched_per_vs(mock):
+    attaches = [('vs.attach', {'VS_ID': f'vs_{i % 2}', 'FILE_ID': f'file-{i}'}) for i in range(20)]
+    results = _run(mock, lambda ex: ex.gather(attaches))
+    assert mock.hits.get('vs.batch') == 2 and 'vs.attach' not in mock.hits
+    assert all(r['object'] == 'vector_store.file' and r['id'] == p['FILE_ID'] and r['vector_store_id'] == p['VS_ID']
+               and r['batch_id'].startswith('vsfb_') for (_, p), r in zip(attaches, results))
+    single = _run(mock, lambda ex: ex.call('vs.attach', {'VS_ID': 'vs_9', 'FILE_ID': 'file-x'}))
+    assert single['object'] == 'vector_store.file'
+
+
+def test_attach_batches_never_mix_api_keys(mock):
+    attaches = [('vs.attach', {'VS_ID': 'vs_1', 'FILE_ID': f'file-{i}', 'API_KEY': f'sk-owner{i % 2}'})
+                for i in range(6)]
+    attaches.append(('vs.attach', {'VS_ID': 'vs_1', 'FILE_ID': 'file-x'}))  # clave por defecto del executor
+    results = _run(mock, lambda ex: ex.gather(attaches))
+    assert [r['id'] for r in results] == [p['FILE_ID'] for _, p in attaches]
+    assert sorted(mock.auth['vs.batch']) == ['Bearer sk-owner0', 'Bearer sk-owner1']
+    assert mock.auth['vs.attach'] == ['Bearer sk-test']
+
+
+def test_concurrency_limit_and_connection_reuse(mock):
+    gets = [('vs.store.file.get', {'VS_ID': 'vs_1', 'FILE_ID': f'file-{i}'}) for i in range(40)]
+    started = time.perf_counter()
+    results = _run(mock, lambda ex: ex.gather(gets))
+    elapsed = time.perf_counter() - started
+    assert all(r.get('status') == 'completed' for r in results)
+    assert mock.peak <= 4
+    assert elapsed < 40 * 0.02 * 0.6
+    assert mock.connections <= 4
+
+
+def test_errors_reach_the_caller(mock):
+    listing = _run(mock, lambda ex: ex.call('vs.files', {'VS_ID': 'vs_1'}))
+    assert isinstance(listing['data'], list)
+    errors = _run(mock, lambda ex: ex.gather([
+        ('vs.get', {}),
+        ('vs.get', {'FILE_ID': 'missing-1'}),
+        ('vs.attach_batch', {'VS_ID': 'missing-vs', 'FILE_IDS_JSON': ['a']}),
+        ('analyze', {}),
+    ]))
+    assert isinstance(errors[0], OpsError) and 'FILE_ID' in str(errors[0])
+    assert isinstance(errors[1], OpsError) and errors[1].status == 404 and 'No such object' in str(errors[1])
+    assert isinstance(errors[2], OpsError)
+    assert isinstance(errors[3], OpsError)
+
+
+# ------------------------------------------------------ reintentos del pool
+
+OK = b'HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\n{}'
+
+
+async def _server(kind):
+    """Request 1 and 3+ get ``OK`` (keep-alive); request 2 gets ``kind`` and the connection is closed."""
+    seen = []
+    second = {'stale': b'', 'partial': b'HTTP/1.1 200 OK\r\nContent-Length: 50\r\n\r\n{"id"'}[kind]
+
+    async def handle(reader, writer):
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            while (await reader.readline()) not in (b'\r\n', b''):
+                pass
+            seen.append(line)
+            writer.write(second if len(seen) == 2 else OK)
+            await writer.drain()
+            if len(seen) == 2:
+                break
+        writer.close()
+
+    server = await asyncio.start_server(handle, '127.0.0.1', 0)
+    return server, seen
+
+
+def _exchange(kind, method):
+    async def go():
+        server, seen = await _server(kind)
+        url = f'http://127.0.0.1:{server.sockets[0].getsockname()[1]}/x'
+        pool = ConnectionPool(timeout=5)
+        try:
+            await pool.request(method, url, [])
+            try:
+                result = await pool.request(method, url, [], b'{}' if method == 'POST' else None)
+            except (ConnectionError, asyncio.IncompleteReadError) as exc:
+                result = exc
+        finally:
+            pool.close()
+            server.close()
+        return result, len(seen)
+
+    return asyncio.run(go())
+
+
+def test_stale_connection_is_retried_even_for_post():
+    result, requests = _exchange('stale', 'POST')
+    assert result == (200, {'content-length': '2'}, b'{}')
+    assert requests == 3
+
+
+def test_partial_response_is_not_resent_for_post():
+    result, requests = _exchange('partial', 'POST')
+    assert isinstance(result, asyncio.IncompleteReadError)
+    assert requests == 2
+
+
+def test_partial_response_is_retried_for_get():
+    result, requests = _exchange('partial', 'GET')
+    assert result[0] == 200
+    assert requests == 3
+
+
+def test_prompt_is_escaped_inside_json_body(mock):
+    prompt = 'Extrae "todo"\n\nArchivo: informe\tQ1.pdf (#7) \\ fin'
+    thread = _run(mock, lambda ex: ex.call('thread.create', {'USER_PROMPT': prompt, 'VS_ID': 'vs_1'}))
+    assert mock.threads[thread['id']] == prompt
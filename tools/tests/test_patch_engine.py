@@ -0,0 +1,49 @@
+from pathlib import Path
+
+import pytest
+
+from tools.patch_engine import BOM, Edit, FileJob, PatchError, load_jobs, patch_file, patch_text
+
+
+def test_bom_and_crlf_preserved(tmp_path):
+    path = tmp_path / 'a.php'
+    path.write_bytes(BOM + b'<?php\r\n$a = 1;\r\n$b = 2;\r\n')
+    edit = Edit(start='$a = 1;\n$b', replacement='$a = 10;\n$b')
+    result = patch_file(FileJob(str(path), [edit]))
+    assert result.status == 'changed' and result.applied == [edit.label]
+    assert path.read_bytes() == BOM + b'<?php\r\n$a = 10;\r\n$b = 2;\r\n'
+
+
+def test_after_and_occurrence_anchoring():
+    text = 'x = 1\nblock G\nx = 1\nx = 1\nblock H\nx = 1\n'
+    assert patch_text(text, [Edit(start='x = 1', replacement='y', after='block G')]) == \
+        'x = 1\nblock G\ny\nx = 1\nblock H\nx = 1\n'
+    assert patch_text(text, [Edit(start='x = 1', replacement='y', after='block G', occurrence=2)]) == \
+        'x = 1\nblock G\nx = 1\ny\nblock H\nx = 1\n'
+    assert patch_text(text, [Edit(start='block G', end='block H', include_end=False, replacement='')]) == \
+        'x = 1\nblock H\nx = 1\n'
+
+
+def test_overlapping_spans_are_rejected():
+    edits = [Edit(start='abc', replacement='1', label='one'), Edit(start='bcd', replacement='2', label='two')]
+    with pytest.raises(PatchError, match='overlaps'):
+        patch_text('abcdef', edits)
+
+
+def test_missing_required_marker_is_an_error(tmp_path):
+    path = tmp_path / 'a.php'
+    path.write_text('hola\n')
+    result = patch_file(FileJob(str(path), [Edit(start='adios', replacement='x', label='e')]))
+    assert result.status == 'error' and 'start marker not found' in result.error
+    assert path.read_text() == 'hola\n'
+
+
+def test_glob_edits_are_optional_and_skip_unmatched_files(tmp_path):
+    (tmp_path / 'a_safe.php').write_text('OLD\n')
+    (tmp_path / 'b_safe.php').write_text('otro\n')
+    jobs = load_jobs([{'glob': '*_safe.php', 'edits': [{'start': 'OLD', 'replacement': 'NEW'}]}], tmp_path)
+    results = {Path(r.path).name: r for r in map(patch_file, jobs)}
+    assert results['a_safe.php'].status == 'changed'
+    assert results['b_safe.php'].status == 'skipped'
+    assert (tmp_path / 'a_safe.php').read_text() == 'NEW\n'
+    assert (tmp_path / 'b_safe.php').read_text() == 'otro\n'
@@ -0,0 +1,96 @@
+import base64
+import hashlib
+import hmac
+import json
+import threading
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from tools.result_cache import ResultCache, jwt_claims, main, make_proxy
+
+NOW = 1_760_000_000
+SECRET = 'clave-de-prueba'
+
+
+def _token(exp, secret=SECRET, sub='4'):
+    def enc(data):
+        return base64.urlsafe_b64encode(json.dumps(data).encode()).rstrip(b'=').decode()
+
+    head = f"{enc({'alg': 'HS256', 'typ': 'JWT'})}.{enc({'sub': sub, 'exp': exp})}"
+    sig = hmac.new(secret.encode(), head.encode(), hashlib.sha256).digest()
+    return 'Bearer ' + head + '.' + base64.urlsafe_b64encode(sig).rstrip(b'=').decode()
+
+
+def test_jwt_claims_like_require_user():
+    assert jwt_claims(_token(NOW + 60), SECRET, NOW)['sub'] == '4'
+    assert jwt_claims(_token(NOW + 60), None, NOW) is not None
+    assert jwt_claims(_token(NOW), SECRET, NOW) is None  # caducado
+    assert jwt_claims(_token(NOW + 60, secret='otra'), SECRET, NOW) is None
+    assert jwt_claims('Bearer basura', None, NOW) is None
+    assert jwt_claims('', None, NOW) is None
+
+
+@pytest.fixture
+def proxy(tmp_path):
+    calls = []
+
+    class Upstream(BaseHTTPRequestHandler):
+        def do_POST(self):
+            self.rfile.read(int(self.headers['Content-Length']))
+            calls.append(self.headers['Authorization'])
+            body = json.dumps({'ok': True, 'text': f'respuesta {len(calls)}'}).encode()
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    upstream = ThreadingHTTPServer(('127.0.0.1', 0), Upstream)
+    cache = ResultCache(tmp_path, clock=lambda: NOW)
+    server = make_proxy(cache, f'http://127.0.0.1:{upstream.server_address[1]}', 0, jwt_secret=SECRET)
+    for srv in (upstream, server):
+        threading.Thread(target=srv.serve_forever, daemon=True).start()
+
+    def post(auth):
+        req = urllib.request.Request(f'http://127.0.0.1:{server.server_address[1]}/', method='POST',
+                                     data=json.dumps({'prompt': 'SPY?'}).encode(), headers={'Authorization': auth})
+        with urllib.request.urlopen(req) as resp:
+            return resp.headers.get('X-Cache'), json.loads(resp.read())['text']
+
+    yield post, calls
+    for srv in (upstream, server):
+        srv.shutdown()
+        srv.server_close()
+
+
+def test_proxy_serves_hits_only_to_valid_tokens(proxy):
+    post, calls = proxy
+    valid = _token(NOW + 60)
+    assert post(valid) == ('MISS', 'respuesta 1')
+    assert post(valid) == ('HIT', 'respuesta 1')
+    assert len(calls) == 1
+    # Firma de otra clave o token caducado: siempre va a PHP, sin pasar por el caché.
+    forged = _token(NOW + 60, secret='otra')
+    assert post(forged) == (None, 'respuesta 2')
+    assert post(forged) == (None, 'respuesta 3')
+    assert post(_token(NOW - 1)) == (None, 'respuesta 4')
+
+
+def test_cache_follows_the_user_not_the_token(proxy):
+    post, calls = proxy
+    assert post(_token(NOW + 60)) == ('MISS', 'respuesta 1')
+    assert post(_token(NOW + 3600)) == ('HIT', 'respuesta 1')  # token nuevo del mismo usuario
+    assert post(_token(NOW + 60, sub='5')) == ('MISS', 'respuesta 2')
+    assert len(calls) == 2
+
+
+def test_serve_requires_the_jwt_secret(tmp_path, monkeypatch):
+    monkeypatch.delenv('JWT_SECRET', raising=False)
+    with pytest.raises(ValueError):
+        make_proxy(ResultCache(tmp_path), 'http://127.0.0.1:9/', 0)
+    with pytest.raises(SystemExit):
+        main(['--root', str(tmp_path), 'serve', '--upstream', 'http://127.0.0.1:9/'])
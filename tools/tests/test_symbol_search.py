@@ -0,0 +1,25 @@
+import json
+
+from tools.symbol_search import SymbolSearchService
+
+
+def test_bad_rebuild_keeps_current_index(tmp_path):
+    path = tmp_path / 'universe.json'
+    path.write_text(json.dumps([{'symbol': 'AAPL', 'name': 'Apple Inc'}]), encoding='utf-8')
+    service = SymbolSearchService(path, check_interval=0)
+    stamp = service._stamp
+    path.write_text('[{"symbol": "MSFT", "na', encoding='utf-8')  # escritura a medias
+    service._rebuilding = True
+    service._rebuild()
+    assert service._stamp == stamp
+    assert [row['symbol'] for row in service.index.search('aapl')] == ['AAPL']
+
+    path.write_text(json.dumps([{'symbol': 'MSFT', 'name': 'Microsoft'}]), encoding='utf-8')
+    service._rebuilding = True
+    service._rebuild()
+    assert [row['symbol'] for row in service.index.search('msft')] == ['MSFT']
+
+
+def test_missing_file_starts_empty(tmp_path):
+    service = SymbolSearchService(tmp_path / 'nope.json')
+    assert service.search('aapl') == []